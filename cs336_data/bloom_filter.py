@@ -0,0 +1,108 @@
+import math
+
+import numpy as np
+
+UINT32_MASK = np.uint64((1 << 32) - 1)
+
+
+class BloomFilter:
+    """
+    A Bloom filter over 64-bit hashes (e.g. from `hash_lines`) sized for `capacity` items at `error_rate`.
+    The k bit positions of a hash are derived from its two 32-bit halves by double hashing.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.num_hash_functions = max(round(self.num_bits / capacity * math.log(2)), 1)
+        self.count = 0
+        self.bits = np.zeros((self.num_bits + 7) // 8, dtype=np.uint8)
+
+    @property
+    def nbytes(self) -> int:
+        return self.bits.nbytes
+
+    def _bit_positions(self, hashes: np.ndarray) -> np.ndarray:
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        h1 = hashes & UINT32_MASK
+        h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+        steps = np.arange(self.num_hash_functions, dtype=np.uint64)
+        return (h1[:, None] + steps * h2[:, None]) % np.uint64(self.num_bits)
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        positions = self._bit_positions(hashes)
+        is_set = self.bits[positions >> np.uint64(3)] & (np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8))
+        return is_set.all(axis=1)
+
+    def add(self, hashes: np.ndarray):
+        positions = self._bit_positions(hashes).ravel()
+        np.bitwise_or.at(self.bits, positions >> np.uint64(3), np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8))
+        self.count += len(hashes)
+
+
+class ScalableBloomFilter:
+    """
+    First-seen tracking for a stream of 64-bit hashes with an overall false positive rate of at most
+    `error_rate`, without knowing the number of distinct items up front (Almeida et al., 2007).
+
+    Items go into a chain of `BloomFilter`s: when the newest one reaches its capacity, a new one that is
+    `growth_factor` times larger with a `tightening_ratio` times smaller error rate is appended, so the error
+    rates sum to `error_rate`. Memory therefore grows with the number of distinct items (about 2 bytes each
+    at the default error rate). Once another filter would take more than `max_bytes` in total, the newest
+    filter keeps absorbing items past its capacity: memory stays fixed and the error rate rises instead.
+    """
+
+    def __init__(
+        self,
+        initial_capacity: int = 1 << 20,
+        error_rate: float = 1e-4,
+        growth_factor: int = 2,
+        tightening_ratio: float = 0.5,
+        max_bytes: int | None = None,
+    ):
+        self.error_rate = error_rate
+        self.growth_factor = growth_factor
+        self.tightening_ratio = tightening_ratio
+        self.max_bytes = max_bytes
+        self.filters = [BloomFilter(initial_capacity, error_rate * (1 - tightening_ratio))]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(bloom_filter.nbytes for bloom_filter in self.filters)
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        seen = np.zeros(len(hashes), dtype=bool)
+        for bloom_filter in self.filters:
+            seen |= bloom_filter.contains(hashes)
+        return seen
+
+    def add(self, hashes: np.ndarray) -> np.ndarray:
+        """
+        Adds `hashes` in order and returns a mask of the ones that were (probably) seen before, either in an
+        earlier call or earlier in this batch.
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        seen = np.ones(len(hashes), dtype=bool)
+        _, first_occurrences = np.unique(hashes, return_index=True)
+        seen[first_occurrences] = self.contains(hashes[first_occurrences])
+
+        new_hashes = hashes[~seen]
+        while len(new_hashes) > 0:
+            bloom_filter = self.filters[-1]
+            room = bloom_filter.capacity - bloom_filter.count
+            if room <= 0:
+                if self._grow():
+                    continue
+                room = len(new_hashes)
+            bloom_filter.add(new_hashes[:room])
+            new_hashes = new_hashes[room:]
+        return seen
+
+    def _grow(self) -> bool:
+        newest = self.filters[-1]
+        bloom_filter = BloomFilter(newest.capacity * self.growth_factor, newest.error_rate * self.tightening_ratio)
+        if self.max_bytes is not None and self.nbytes + bloom_filter.nbytes > self.max_bytes:
+            return False
+        self.filters.append(bloom_filter)
+        return True
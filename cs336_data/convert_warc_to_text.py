@@ -1,16 +1,29 @@
+import os
+import glob
+import shutil
+import tempfile
 import fsspec
+import math
+import mmh3
 import random
+from cs336_data.executors import Backend, run_tasks
 from cs336_data.extraction import extract_text_from_html_bytes
+from cs336_data.warc_index import count_warc_records
 from fastwarc.warc import ArchiveIterator, WarcRecordType
 from fastwarc.stream_io import *
 import draccus
-from dataclasses import dataclass
-from typing import Optional, Literal
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Iterator, Optional, Literal, TypeVar
 
 WARC_RECORD_RESPONSE_ENUM_FLAG = 4
+HTML_CONTENT_TYPES = ["text/html", "application/xhtml+xml"]
+
+T = TypeVar("T")
 
 @dataclass
 class WarcToTextConfig:
+    # A single WARC, or a glob of WARCs that are converted in parallel and merged into one shuffled output
     input_path: str
     output_path: str
     # Random sampling parameters
@@ -22,82 +35,326 @@ class WarcToTextConfig:
     sample_count: int = -1
     # Random seed for reproducible sampling
     random_seed: Optional[int] = 42
+    # Records with another HTTP Content-Type are skipped without reading their body (records without one are kept)
+    allowed_content_types: list[str] = field(default_factory=lambda: list(HTML_CONTENT_TYPES))
+    # Records whose WARC block (HTTP headers plus body) is larger are skipped without reading it, and no more
+    # than this is read from the body of any record
+    max_record_bytes: int = 5 * 2**20
+    # Glob input only: "local" converts the WARCs on a process pool, "slurm" as a job array
+    backend: Backend = "local"
+    num_workers: int | None = None
+    # Glob input only: the merge shuffles buckets of about this many bytes in memory
+    shuffle_memory_limit: int = 1 << 30
+    # Glob input with "count" sampling: where the WARC indexes used to split the quota are saved; defaults to
+    # next to each WARC, and WARCs whose index cannot be saved are still counted
+    index_directory: str | None = None
 
 @draccus.wrap()
 def main(config: WarcToTextConfig):
-    # Set random seed if specified
-    if config.random_seed is not None:
-        random.seed(config.random_seed)
-        
-    iterator = ArchiveIterator(GZipStream(FileStream(config.input_path, 'rb')), record_types=WARC_RECORD_RESPONSE_ENUM_FLAG)
+    if any(char in config.input_path for char in "*?["):
+        input_paths = sorted(glob.glob(config.input_path))
+        if not input_paths:
+            raise FileNotFoundError(f"No WARC files match {config.input_path}")
+        report = convert_warc_files(
+            input_paths,
+            config.output_path,
+            config.label,
+            config.sampling_method,
+            config.sampling_rate,
+            config.sample_count,
+            config.random_seed,
+            config.allowed_content_types,
+            config.max_record_bytes,
+            config.backend,
+            config.num_workers,
+            config.shuffle_memory_limit,
+            config.index_directory,
+        )
+    else:
+        # Set random seed if specified
+        if config.random_seed is not None:
+            random.seed(config.random_seed)
+        report = convert_warc_file(
+            config.input_path,
+            config.output_path,
+            config.label,
+            config.sampling_method,
+            config.sampling_rate,
+            config.sample_count,
+            config.allowed_content_types,
+            config.max_record_bytes,
+        )
+    print_conversion_report(report)
+
+def convert_warc_file(
+    input_path: str,
+    output_path: str,
+    label: str,
+    sampling_method: Optional[Literal["probability", "count"]] = None,
+    sampling_rate: float = 1.0,
+    sample_count: int = -1,
+    allowed_content_types: list[str] = HTML_CONTENT_TYPES,
+    max_record_bytes: int = 5 * 2**20,
+) -> dict[str, int]:
+    """Writes the fastText lines of one WARC's (sampled) HTML responses and returns the conversion report."""
+    iterator = ArchiveIterator(GZipStream(FileStream(input_path, 'rb')), record_types=WARC_RECORD_RESPONSE_ENUM_FLAG)
+    report = Counter()
     
     # If no sampling method is specified, process all records
-    if config.sampling_method is None:
-        process_all_records(iterator, config.output_path, config.label, config.sample_count)
+    if sampling_method is None:
+        records = iter_html_records(iterator, report, allowed_content_types, max_record_bytes)
+        process_all_records(records, output_path, label, sample_count)
     # Probability-based sampling
-    elif config.sampling_method == "probability":
-        probability_sampling(iterator, config.output_path, config.sampling_rate, config.label)
-    # Count-based sampling (reservoir sampling)
-    elif config.sampling_method == "count":
-        count_sampling(iterator, config.output_path, config.sample_count, config.label)
+    elif sampling_method == "probability":
+        records = iter_html_records(iterator, report, allowed_content_types, max_record_bytes)
+        probability_sampling(records, output_path, sampling_rate, label)
+    # Count-based sampling (reservoir sampling); bodies are only read for the records that enter the reservoir
+    elif sampling_method == "count":
+        records = iter_prefiltered_records(iterator, report, allowed_content_types, max_record_bytes)
+        report["num_extracted"] = count_sampling(records, output_path, sample_count, label, max_record_bytes)
     else:
-        raise ValueError(f"Unknown sampling method: {config.sampling_method}")
+        raise ValueError(f"Unknown sampling method: {sampling_method}")
+    return dict(report)
+
+def input_root(input_paths: list[str]) -> str:
+    """The deepest directory containing every input, e.g. the non-wildcard prefix of the glob they came from."""
+    if not input_paths:
+        return os.getcwd()
+    return os.path.commonpath([os.path.dirname(os.path.abspath(input_path)) for input_path in input_paths])
+
+def shard_seed(random_seed: int | None, input_path: str, root: str) -> int | None:
+    """
+    A seed for one WARC that depends only on the global seed and its path relative to `root`, so WARCs with
+    the same name in different directories are sampled differently.
+    """
+    if random_seed is None:
+        return None
+    return mmh3.hash(os.path.relpath(os.path.abspath(input_path), root), random_seed, signed=False)
+
+def apportion_quota(counts: list[int], quota: int) -> list[int]:
+    """Splits `quota` across shards in proportion to their `counts` (largest remainder method), capped at each count."""
+    total = sum(counts)
+    if total <= quota:
+        return list(counts)
+    exact_shares = [count * quota / total for count in counts]
+    shares = [math.floor(exact_share) for exact_share in exact_shares]
+    by_remainder = sorted(range(len(counts)), key=lambda i: exact_shares[i] - shares[i], reverse=True)
+    for i in by_remainder[:quota - sum(shares)]:
+        shares[i] += 1
+    return shares
+
+def convert_warc_shard(input_path: str, output_path: str, seed: int | None, *args) -> dict[str, int]:
+    """Conversion task for one WARC of a glob; `args` are passed on to `convert_warc_file`."""
+    random.seed(seed)
+    return convert_warc_file(input_path, output_path, *args)
+
+def merge_and_shuffle(input_paths: list[str], output_path: str, seed: int | None = None, memory_limit: int = 1 << 30):
+    """
+    Concatenates the lines of `input_paths` into `output_path` in random order without holding them all in
+    memory: lines are first scattered across random buckets on disk, each small enough to shuffle in memory.
+    """
+    rng = random.Random(seed)
+    total_bytes = sum(os.path.getsize(input_path) for input_path in input_paths)
+    num_buckets = max(math.ceil(total_bytes / memory_limit), 1)
+    with tempfile.TemporaryDirectory(prefix="shuffle_", dir=os.path.dirname(os.path.abspath(output_path))) as bucket_directory:
+        bucket_paths = [os.path.join(bucket_directory, f"{bucket_idx:05d}.txt") for bucket_idx in range(num_buckets)]
+        buckets = [open(bucket_path, "w", newline="\n") for bucket_path in bucket_paths]
+        try:
+            for input_path in input_paths:
+                # Only "\n" ends a line; extracted text may still contain other line breaks
+                with fsspec.open(input_path, "rt", compression="infer", newline="\n") as f_in:
+                    for line in f_in:
+                        buckets[rng.randrange(num_buckets)].write(line)
+        finally:
+            for bucket in buckets:
+                bucket.close()
+
+        with fsspec.open(output_path, "w", compression="infer", newline="\n") as f_out:
+            for bucket_path in bucket_paths:
+                with open(bucket_path, newline="\n") as f_bucket:
+                    lines = f_bucket.readlines()
+                rng.shuffle(lines)
+                f_out.writelines(lines)
+
+def convert_warc_files(
+    input_paths: list[str],
+    output_path: str,
+    label: str,
+    sampling_method: Optional[Literal["probability", "count"]] = None,
+    sampling_rate: float = 1.0,
+    sample_count: int = -1,
+    random_seed: int | None = 42,
+    allowed_content_types: list[str] = HTML_CONTENT_TYPES,
+    max_record_bytes: int = 5 * 2**20,
+    backend: Backend = "local",
+    num_workers: int | None = None,
+    shuffle_memory_limit: int = 1 << 30,
+    index_directory: str | None = None,
+) -> dict[str, int]:
+    """
+    Converts many WARCs in parallel tasks and merges them into one shuffled `output_path`. Each WARC is
+    sampled with its own seed derived from `random_seed` and its path below the inputs' common directory, so
+    runs are reproducible. With "count" sampling, a global `sample_count` is split across the WARCs in
+    proportion to their number of HTML responses with an allowed (or no) Content-Type, read from their
+    `warc_index` (built in a first round of tasks if missing, and saved in `index_directory` if given);
+    records that the prefilter then skips for their status or size can leave the total slightly short of it.
+    Other sampling methods pass `sample_count` on to every WARC unchanged, as `convert_warc_file` would use it.
+    """
+    sample_counts = [sample_count] * len(input_paths)
+    if sampling_method == "count" and sample_count != -1:
+        # The prefilter keeps responses without a Content-Type, which the index records as ""
+        counted_content_types = [*allowed_content_types, ""]
+        num_responses = run_tasks(
+            count_warc_records,
+            [
+                (input_path, int(WarcRecordType.response), counted_content_types, index_directory)
+                for input_path in input_paths
+            ],
+            backend,
+            num_workers,
+            desc="Indexing",
+        )
+        sample_counts = apportion_quota(num_responses, sample_count)
+
+    shard_directory = f"{output_path}.shards"
+    os.makedirs(shard_directory, exist_ok=True)
+    root = input_root(input_paths)
+    # Shards are named after the position of their WARC, since WARCs in different directories can share a name
+    tasks = [
+        (
+            input_path,
+            os.path.join(shard_directory, f"{shard_idx:05d}.txt"),
+            shard_seed(random_seed, input_path, root),
+            label,
+            sampling_method,
+            sampling_rate,
+            shard_sample_count,
+            allowed_content_types,
+            max_record_bytes,
+        )
+        for shard_idx, (input_path, shard_sample_count) in enumerate(zip(input_paths, sample_counts))
+        # Shards whose share of the quota rounds down to nothing are not read at all
+        if shard_sample_count != 0
+    ]
+    reports = run_tasks(convert_warc_shard, tasks, backend, num_workers, desc="Converting")
+
+    merge_and_shuffle([task[1] for task in tasks], output_path, random_seed, shuffle_memory_limit)
+    shutil.rmtree(shard_directory)
+    report = Counter()
+    for shard_report in reports:
+        report.update(shard_report)
+    return dict(report)
+
+def prefilter_reason(record, allowed_content_types: list[str], max_record_bytes: int) -> str | None:
+    """Why `record` should be skipped judging by its WARC and HTTP headers alone, or None to extract it."""
+    if record.http_headers is None:
+        return "skipped_not_http"
+    if not 200 <= record.http_headers.status_code < 300:
+        return "skipped_status"
+    if record.http_content_type and record.http_content_type.lower() not in allowed_content_types:
+        return "skipped_content_type"
+    # content_length is the WARC block length declared in the WARC headers, so it includes the HTTP headers as
+    # well as the body; reading the body is never needed
+    if record.content_length > max_record_bytes:
+        return "skipped_too_large"
+    return None
 
-def get_fasttext_format(record_body, label):
-    text = extract_text_from_html_bytes(record_body)
+def iter_prefiltered_records(
+    iterator,
+    report: Counter,
+    allowed_content_types: list[str] = HTML_CONTENT_TYPES,
+    max_record_bytes: int = 5 * 2**20,
+) -> Iterator:
+    """Yields the records that pass `prefilter_reason` without reading them. `report` counts the records seen and skipped (per reason)."""
+    for record in iterator:
+        report["num_records"] += 1
+        reason = prefilter_reason(record, allowed_content_types, max_record_bytes)
+        if reason is not None:
+            report[reason] += 1
+            continue
+        yield record
+
+def read_record(record, max_record_bytes: int = 5 * 2**20) -> tuple[bytes, str | None]:
+    """(body, HTTP Content-Type) of a record, reading at most `max_record_bytes` of the body."""
+    return record.reader.read(max_record_bytes), record.http_headers.get("Content-Type")
+
+def iter_html_records(
+    iterator,
+    report: Counter,
+    allowed_content_types: list[str] = HTML_CONTENT_TYPES,
+    max_record_bytes: int = 5 * 2**20,
+) -> Iterator[tuple[bytes, str | None]]:
+    """
+    Yields (body, HTTP Content-Type) for the records that pass `prefilter_reason`, reading at most
+    `max_record_bytes` of each. `report` counts the records seen, skipped (per reason) and yielded.
+    """
+    for record in iter_prefiltered_records(iterator, report, allowed_content_types, max_record_bytes):
+        report["num_extracted"] += 1
+        yield read_record(record, max_record_bytes)
+
+def print_conversion_report(report: dict[str, int]):
+    print(f"Records: {report.get('num_records', 0)}, extracted: {report.get('num_extracted', 0)}")
+    for reason in ("skipped_not_http", "skipped_status", "skipped_content_type", "skipped_too_large"):
+        print(f"  {reason}: {report.get(reason, 0)}")
+
+def get_fasttext_format(record_body, label, content_type=None):
+    text = extract_text_from_html_bytes(record_body, content_type)
     text = text.replace("\n", " ")
     return f"__label__{label} {text}"
 
-def process_all_records(iterator, output_path, label, sample_count):
+def process_all_records(records, output_path, label, sample_count):
     with fsspec.open(output_path, 'w', compression="infer") as f_out:
-        for i, record in enumerate(iterator):
+        for i, (record_body, content_type) in enumerate(records):
             if sample_count != -1 and i >= sample_count:
                 break
-            record_body = record.reader.read()
-            f_out.write(get_fasttext_format(record_body, label) + "\n")
+            f_out.write(get_fasttext_format(record_body, label, content_type) + "\n")
 
-def probability_sampling(iterator, output_path, sampling_rate, label):
+def probability_sampling(records, output_path, sampling_rate, label):
     """Sample records with a fixed probability."""
     with fsspec.open(output_path, 'w', compression="infer") as f_out:
-        for record in iterator:
+        for record_body, content_type in records:
             # Skip with probability (1 - sampling_rate)
             if random.random() > sampling_rate:
                 continue
                 
-            record_body = record.reader.read()
-            f_out.write(get_fasttext_format(record_body, label) + "\n")
+            f_out.write(get_fasttext_format(record_body, label, content_type) + "\n")
 
-def count_sampling(iterator, output_path, sample_count, label):
-    """Use reservoir sampling to select a fixed number of samples."""
+def reservoir_sample(items: Iterable, sample_count: int, read: Callable[..., T] = lambda item: item) -> list[T]:
+    """
+    A uniform sample of `sample_count` items (all of them if there are fewer), in no particular order, using
+    Algorithm L (Li, 1994). After the reservoir is full, it draws how many items to skip before the next
+    replacement, so `read` is only called on the O(k log(n / k)) items that enter the reservoir.
+    """
     if sample_count <= 0:
         raise ValueError("Sample count must be positive")
-        
-    # First pass to count total records (optional if total count is known)
-    # This is needed because we can't sample exactly N records without knowing the total
-    # OR we can use reservoir sampling which doesn't require knowing the total
-    
-    # Reservoir sampling implementation
+
     reservoir = []
-    count = 0
-    
-    for record in iterator:
-        count += 1
-        record_body = record.reader.read()
-        text = extract_text_from_html_bytes(record_body)
-        
-        if len(reservoir) < sample_count:
-            # Fill the reservoir until we have sample_count items
-            reservoir.append(text)
-        else:
-            # Randomly replace items with decreasing probability
-            j = random.randint(0, count - 1)
-            if j < sample_count:
-                reservoir[j] = text
-    
+    weight = 1.0
+    next_index = sample_count
+    for i, item in enumerate(items):
+        if i < sample_count:
+            reservoir.append(read(item))
+            if i == sample_count - 1:
+                weight = math.exp(math.log(random.random()) / sample_count)
+                next_index = sample_count + math.floor(math.log(random.random()) / math.log(1 - weight))
+        elif i == next_index:
+            reservoir[random.randrange(sample_count)] = read(item)
+            weight *= math.exp(math.log(random.random()) / sample_count)
+            next_index += math.floor(math.log(random.random()) / math.log(1 - weight)) + 1
+    return reservoir
+
+def count_sampling(records, output_path, sample_count, label, max_record_bytes=5 * 2**20) -> int:
+    """
+    Samples `sample_count` of the (unread) `records` with `reservoir_sample`, keeping only the raw bodies
+    of the survivors, and extracts text from those alone. Returns the number of records written.
+    """
+    reservoir = reservoir_sample(records, sample_count, lambda record: read_record(record, max_record_bytes))
+
     # Write the sampled records to the output file
     with fsspec.open(output_path, 'w', compression="infer") as f_out:
-        for text in reservoir:
-            f_out.write(get_fasttext_format(text, label) + "\n")
+        for record_body, content_type in reservoir:
+            f_out.write(get_fasttext_format(record_body, label, content_type) + "\n")
+    return len(reservoir)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,20 +1,19 @@
 from dataclasses import dataclass
 import draccus
-from fastwarc.warc import ArchiveIterator, WarcRecordType
-from fastwarc.stream_io import *
-
-WARC_RECORD_RESPONSE_ENUM_FLAG = 4
+from fastwarc.warc import WarcRecordType
+from cs336_data.warc_index import load_warc_index
 
 @dataclass
 class FileConfig:
     input_path: str
+    # Where the index is saved; defaults to next to the file. If it cannot be saved, the file is counted anyway
+    index_directory: str | None = None
 
 @draccus.wrap()
 def main(config: FileConfig):
-    iterator = ArchiveIterator(GZipStream(FileStream(config.input_path, 'rb')), record_types=WARC_RECORD_RESPONSE_ENUM_FLAG)
-    count = 0
-    for record in iterator:
-        count += 1
+    # Builds the index on the first run over a file; later runs only load it
+    index = load_warc_index(config.input_path, index_directory=config.index_directory)
+    count = index.count(WarcRecordType.response)
     print(f"Number of samples: {count}")
 
 
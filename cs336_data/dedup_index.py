@@ -0,0 +1,263 @@
+import json
+import os
+import shutil
+from dataclasses import dataclass
+from typing import Iterator
+
+import numpy as np
+
+from cs336_data.jsonl_io import write_json_atomically
+from cs336_data.line_hash_index import band_keys, merge_counts
+
+# Bumped whenever the on-disk layout changes; indexes written with another version are refused
+FORMAT_VERSION = 2
+MANIFEST_NAME = "manifest.json"
+# (query, indexed document) pairs of a bucket compared at once
+QUERY_BLOCK_SIZE = 1 << 16
+
+
+def band_starts(num_hashes: int, num_bands: int) -> range:
+    """The first signature column of every LSH band, as `lsh_bands` splits signatures."""
+    return range(0, num_hashes, num_hashes // num_bands)
+
+
+def load_array(path: str, dtype: np.dtype, mmap: bool = True) -> np.ndarray:
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=dtype)
+    if mmap:
+        return np.memmap(path, dtype=dtype, mode="r")
+    return np.fromfile(path, dtype=dtype)
+
+
+def iter_bucket_blocks(
+    queries: np.ndarray, starts: np.ndarray, ends: np.ndarray
+) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    """
+    Yields (query, position) pairs pairing every query with each position of its `starts:ends` range of a
+    sorted bucket table, in blocks of about `QUERY_BLOCK_SIZE` pairs (a block never splits a query's range).
+    """
+    sizes = ends - starts
+    block_ends = np.cumsum(sizes)
+    first = 0
+    while first < len(queries):
+        block_start = block_ends[first] - sizes[first]
+        last = max(int(np.searchsorted(block_ends, block_start + QUERY_BLOCK_SIZE, side="right")), first + 1)
+        block_sizes = sizes[first:last]
+        offsets = np.arange(int(block_sizes.sum())) - np.repeat(np.cumsum(block_sizes) - block_sizes, block_sizes)
+        yield np.repeat(queries[first:last], block_sizes), np.repeat(starts[first:last], block_sizes) + offsets
+        first = last
+
+
+@dataclass
+class IndexSegment:
+    """One immutable batch of the index, as added by a single `DedupIndex.add` call."""
+    name: str
+    # Sorted unique line hashes and how often each occurred in the batch
+    line_hashes: np.ndarray
+    line_counts: np.ndarray
+    # (num_documents, num_hashes) MinHash signatures of the documents that were kept
+    signatures: np.ndarray
+    # (num_bands, num_documents) sorted 64-bit band keys, and the signature row of each key
+    band_keys: np.ndarray
+    band_rows: np.ndarray
+
+
+class DedupIndex:
+    """
+    A persistent deduplication index over everything kept so far, holding line-hash counts (for exact line
+    deduplication) and MinHash signatures bucketed by LSH band (for fuzzy document deduplication).
+
+    The index is a directory of immutable segments plus a `manifest.json` listing them along with the format
+    version, the MinHash parameters and a version number that increases with every change. `add` writes the
+    new batch as a new segment and then atomically replaces the manifest, so adding and querying cost time
+    proportional to the new data (plus a binary search per segment), and an interrupted `add` leaves the
+    previous version intact. Segment arrays are raw binary files that are memory-mapped when loaded.
+    `compact` merges all segments into one.
+    """
+
+    def __init__(self, directory: str, manifest: dict, mmap: bool = True):
+        self.directory = directory
+        self.manifest = manifest
+        self.mmap = mmap
+        self.segments = [self._load_segment(name) for name in manifest["segments"]]
+
+    @classmethod
+    def open(
+        cls,
+        directory: str,
+        num_hashes: int | None = None,
+        num_bands: int | None = None,
+        mmap: bool = True,
+    ) -> "DedupIndex":
+        """
+        Loads the index in `directory`, creating an empty one if there is none. The MinHash parameters may be
+        left out when only line hashes are used; once documents have been added, they must match the index.
+        """
+        manifest_path = os.path.join(directory, MANIFEST_NAME)
+        changed = False
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f_manifest:
+                manifest = json.load(f_manifest)
+            if manifest["format_version"] != FORMAT_VERSION:
+                raise ValueError(
+                    f"{directory} has index format version {manifest['format_version']}, expected {FORMAT_VERSION}"
+                )
+        else:
+            os.makedirs(directory, exist_ok=True)
+            manifest = {"format_version": FORMAT_VERSION, "version": 0, "num_hashes": None, "num_bands": None, "segments": []}
+            changed = True
+
+        if num_hashes is not None and (manifest["num_hashes"], manifest["num_bands"]) != (num_hashes, num_bands):
+            if manifest["num_hashes"] is not None:
+                raise ValueError(
+                    f"{directory} was built with num_hashes={manifest['num_hashes']} and "
+                    f"num_bands={manifest['num_bands']}, got {num_hashes} and {num_bands}"
+                )
+            # Only line hashes so far, so the existing segments hold no signatures
+            manifest = {**manifest, "num_hashes": num_hashes, "num_bands": num_bands}
+            changed = True
+        # Opening an existing index with matching parameters only reads it
+        if changed:
+            write_json_atomically(manifest_path, manifest)
+        return cls(directory, manifest, mmap)
+
+    @property
+    def version(self) -> int:
+        return self.manifest["version"]
+
+    @property
+    def num_hashes(self) -> int | None:
+        return self.manifest["num_hashes"]
+
+    @property
+    def num_documents(self) -> int:
+        return sum(len(segment.signatures) for segment in self.segments)
+
+    def _load_segment(self, name: str) -> IndexSegment:
+        segment_directory = os.path.join(self.directory, name)
+
+        def load(filename: str, dtype: np.dtype) -> np.ndarray:
+            return load_array(os.path.join(segment_directory, filename), dtype, self.mmap)
+
+        num_hashes = self.num_hashes or 0
+        num_bands = len(band_starts(num_hashes, self.manifest["num_bands"])) if num_hashes else 0
+        signatures = load("signatures.u32", np.uint32)
+        num_documents = len(signatures) // num_hashes if num_hashes else 0
+        return IndexSegment(
+            name=name,
+            line_hashes=load("line_hashes.u64", np.uint64),
+            line_counts=load("line_counts.u64", np.uint64),
+            signatures=signatures.reshape(num_documents, num_hashes),
+            band_keys=load("band_keys.u64", np.uint64).reshape(num_bands, num_documents),
+            band_rows=load("band_rows.u64", np.uint64).reshape(num_bands, num_documents),
+        )
+
+    def line_counts(self, hashes: np.ndarray) -> np.ndarray:
+        """How often each line hash occurs in the index (0 for lines it has never seen)."""
+        counts = np.zeros(len(hashes), dtype=np.uint64)
+        for segment in self.segments:
+            if len(segment.line_hashes) == 0:
+                continue
+            positions = np.searchsorted(segment.line_hashes, hashes)
+            positions[positions == len(segment.line_hashes)] = 0
+            found = segment.line_hashes[positions] == hashes
+            counts[found] += segment.line_counts[positions[found]]
+        return counts
+
+    def query_documents(self, signatures: np.ndarray, jaccard_threshold: float) -> np.ndarray:
+        """
+        Boolean mask of the `signatures` whose estimated similarity to an indexed document reaches the threshold.
+        Per band and segment, a signature is compared to every indexed document of its bucket, so a near-duplicate
+        is found even when it shares the bucket with dissimilar documents.
+        """
+        is_duplicate = np.zeros(len(signatures), dtype=bool)
+        if self.num_documents == 0:
+            return is_duplicate
+        rows_per_band = self.num_hashes // self.manifest["num_bands"]
+        for band_idx, band_start in enumerate(band_starts(self.num_hashes, self.manifest["num_bands"])):
+            keys = band_keys(signatures[:, band_start:band_start + rows_per_band])
+            for segment in self.segments:
+                if len(segment.signatures) == 0:
+                    continue
+                segment_keys = segment.band_keys[band_idx]
+                starts = np.searchsorted(segment_keys, keys, side="left")
+                ends = np.searchsorted(segment_keys, keys, side="right")
+                candidates = np.flatnonzero((ends > starts) & ~is_duplicate)
+                for queries, positions in iter_bucket_blocks(candidates, starts[candidates], ends[candidates]):
+                    rows = segment.band_rows[band_idx][positions]
+                    similarity = (signatures[queries] == segment.signatures[rows]).mean(axis=1)
+                    is_duplicate[queries[similarity >= jaccard_threshold]] = True
+        return is_duplicate
+
+    def add(
+        self,
+        line_hashes: np.ndarray | None = None,
+        line_counts: np.ndarray | None = None,
+        signatures: np.ndarray | None = None,
+    ):
+        """
+        Adds a batch as a new segment: `line_hashes` (sorted and unique, as yielded by
+        `LineHashCounter.iter_counts`) with their `line_counts`, and/or the `signatures` of kept documents.
+        """
+        if line_hashes is None:
+            line_hashes = line_counts = np.zeros(0, dtype=np.uint64)
+        if signatures is None:
+            signatures = np.zeros((0, self.num_hashes or 0), dtype=np.uint32)
+        elif self.num_hashes is None:
+            raise ValueError("Open the index with num_hashes and num_bands to add signatures")
+        self._write_segment(line_hashes, line_counts, signatures, list(self.manifest["segments"]))
+
+    def compact(self):
+        """Merges every segment into a single one, summing the counts of lines that appear in several."""
+        if len(self.segments) <= 1:
+            return
+        line_hashes, line_counts = merge_counts(
+            np.concatenate([segment.line_hashes for segment in self.segments]),
+            np.concatenate([segment.line_counts for segment in self.segments]),
+        )
+        signatures = np.concatenate([segment.signatures for segment in self.segments])
+        old_segments = [segment.name for segment in self.segments]
+        # Drop the memory maps before their files are removed
+        self.segments = []
+        self._write_segment(line_hashes, line_counts, signatures, [])
+        for name in old_segments:
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    def _write_segment(
+        self,
+        line_hashes: np.ndarray,
+        line_counts: np.ndarray,
+        signatures: np.ndarray,
+        segments: list[str],
+    ):
+        version = self.version + 1
+        name = f"segment-{version:06d}"
+        segment_directory = os.path.join(self.directory, name)
+        temporary_directory = f"{segment_directory}.tmp"
+        # Leftovers of an interrupted add, which the manifest never listed
+        shutil.rmtree(temporary_directory, ignore_errors=True)
+        shutil.rmtree(segment_directory, ignore_errors=True)
+        os.makedirs(temporary_directory)
+
+        def write(filename: str, array: np.ndarray, dtype: np.dtype):
+            np.ascontiguousarray(array, dtype=dtype).tofile(os.path.join(temporary_directory, filename))
+
+        keys, rows = [], []
+        if self.num_hashes is not None:
+            rows_per_band = self.num_hashes // self.manifest["num_bands"]
+            for band_start in band_starts(self.num_hashes, self.manifest["num_bands"]):
+                band = band_keys(signatures[:, band_start:band_start + rows_per_band])
+                order = np.argsort(band, kind="stable")
+                keys.append(band[order])
+                rows.append(order)
+
+        write("line_hashes.u64", line_hashes, np.uint64)
+        write("line_counts.u64", line_counts, np.uint64)
+        write("signatures.u32", signatures, np.uint32)
+        write("band_keys.u64", np.concatenate(keys) if keys else [], np.uint64)
+        write("band_rows.u64", np.concatenate(rows) if rows else [], np.uint64)
+        os.replace(temporary_directory, segment_directory)
+
+        self.manifest = {**self.manifest, "version": version, "segments": segments + [name]}
+        write_json_atomically(os.path.join(self.directory, MANIFEST_NAME), self.manifest)
+        self.segments.append(self._load_segment(name))
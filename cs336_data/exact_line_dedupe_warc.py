@@ -1,35 +1,69 @@
 import os
-import hashlib
 import json
 import gzip
-from collections import Counter
 from dataclasses import dataclass
 import draccus
 import glob
 import tqdm
+import numpy as np
+from typing import Literal
+from cs336_data.bloom_filter import ScalableBloomFilter
+from cs336_data.exact_line_deduplication import iter_line_chunks
+from cs336_data.executors import Backend, run_tasks
+from cs336_data.jsonl_io import StreamingJsonlWriter
+from cs336_data.line_hash_index import LineHashCounter, hash_lines, is_duplicate, partition_bounds, partition_ids
 
 @dataclass
 class Config:
     input_dir: str = "/data/c-cychou/documents-3"
     output_dir: str = "/data/c-cychou/documents-3-deduped"
+    # Bytes of hashes held in memory before spilling to disk
+    memory_limit: int = 1 << 30
+    spill_directory: str | None = None
+    # "single" runs both passes in this process; "mapreduce" hashes, counts and filters in parallel tasks;
+    # "paragraph" removes repeated paragraphs (lines of the text) in one pass with a Bloom filter
+    mode: Literal["single", "mapreduce", "paragraph"] = "single"
+    backend: Backend = "local"
+    num_workers: int | None = None
+    # Map/reduce only: number of hash ranges counted by separate reducers (a power of two)
+    num_partitions: int = 64
+    # Map/reduce only: where mappers write their hash shards; defaults to "<output_dir>-shards"
+    shard_directory: str | None = None
+    # Paragraph only: overall false positive rate of the Bloom filter, i.e. the chance that a paragraph
+    # seen for the first time is dropped anyway
+    bloom_error_rate: float = 1e-4
+    # Paragraph only: distinct paragraphs the first Bloom filter is sized for, and a cap on its total size
+    bloom_initial_capacity: int = 1 << 24
+    bloom_max_bytes: int | None = None
+    # Paragraph only: documents with fewer characters left after deduplication are dropped
+    min_document_length: int = 0
 
-def exact_line_deduplication_warc(input_files: list[str], output_path: str):
+def parse_texts(lines: list[str]) -> list[str | None]:
+    """Returns the non-empty "text" field of each JSONL line, or None for malformed or empty records."""
+    texts = []
+    for line in lines:
+        try:
+            texts.append(json.loads(line.strip()).get("text", "") or None)
+        except json.JSONDecodeError:
+            texts.append(None)
+    return texts
+
+def exact_line_deduplication_warc(
+    input_files: list[str],
+    output_path: str,
+    memory_limit: int = 1 << 30,
+    spill_directory: str | None = None,
+):
     os.makedirs(output_path, exist_ok=True)
 
     # First pass: count occurrences of each text line
-    counts = Counter()
-    for input_file in tqdm.tqdm(input_files):
-        print(f"Counting lines in {input_file}")
-        with gzip.open(input_file, "rt", encoding="utf-8") as f_in:
-            for line in f_in:
-                try:
-                    data = json.loads(line.strip())
-                    text = data.get("text", "")
-                    if text:
-                        line_hash = hashlib.sha256(text.encode()).hexdigest()
-                        counts[line_hash] += 1
-                except json.JSONDecodeError:
-                    continue
+    with LineHashCounter(memory_limit, spill_directory=spill_directory) as counts:
+        for input_file in tqdm.tqdm(input_files):
+            print(f"Counting lines in {input_file}")
+            with gzip.open(input_file, "rt", encoding="utf-8") as f_in:
+                for lines in iter_line_chunks(f_in):
+                    counts.add(hash_lines(text for text in parse_texts(lines) if text is not None))
+        duplicates = counts.duplicates()
 
     num_duplicated = 0
     # Second pass: write deduplicated files
@@ -44,25 +78,210 @@ def exact_line_deduplication_warc(input_files: list[str], output_path: str):
         
         with gzip.open(output_file_path, "wt", encoding="utf-8") as f_out:
             with gzip.open(input_file, "rt", encoding="utf-8") as f_in:
-                for line in f_in:
-                    try:
-                        data = json.loads(line.strip())
-                        text = data.get("text", "")
-                        if text:
-                            line_hash = hashlib.sha256(text.encode()).hexdigest()
-                            if counts[line_hash] > 1:
-                                num_duplicated += 1
-                                continue
-                        f_out.write(line)
-                    except json.JSONDecodeError:
-                        # Keep malformed JSON lines as-is
+                for lines in iter_line_chunks(f_in):
+                    texts = parse_texts(lines)
+                    duplicated = is_duplicate(hash_lines(text or "" for text in texts), duplicates)
+                    for line, text, line_duplicated in zip(lines, texts, duplicated):
+                        # Malformed JSON lines and records without text are kept as-is
+                        if text is not None and line_duplicated:
+                            num_duplicated += 1
+                            continue
                         f_out.write(line)
         
         with gzip.open(f"{output_file_path}.SUCCESS", "wt", encoding="utf-8") as f_out_deduped:
             f_out_deduped.write(f"Deduplicated {input_file} -> {output_file_path}\n")
 
     print(f"Number of duplicated documents removed: {num_duplicated}")
-    print(f"Number of documents: {len(counts)}")
+    print(f"Number of documents: {counts.num_unique}")
+
+def paragraph_deduplication_warc(
+    input_files: list[str],
+    output_path: str,
+    error_rate: float = 1e-4,
+    initial_capacity: int = 1 << 24,
+    max_bytes: int | None = None,
+    min_document_length: int = 0,
+) -> dict[str, int]:
+    """
+    Removes every non-blank paragraph (line of a document's text) that already appeared earlier in
+    `input_files`, keeping its first occurrence, in a single pass. Paragraphs are compared by the 64-bit hash
+    of their stripped text and tracked in a `ScalableBloomFilter`, so memory only depends on the number of
+    distinct paragraphs (and can be capped with `max_bytes`). Documents with fewer than `min_document_length`
+    characters left are dropped; malformed JSON lines and records without text are kept as-is.
+    """
+    os.makedirs(output_path, exist_ok=True)
+    seen_paragraphs = ScalableBloomFilter(initial_capacity, error_rate, max_bytes=max_bytes)
+    stats = {"num_documents": 0, "num_documents_dropped": 0, "num_paragraphs": 0, "num_paragraphs_removed": 0}
+
+    for input_file in tqdm.tqdm(input_files):
+        output_file_path = os.path.join(output_path, os.path.basename(input_file))
+        with gzip.open(input_file, "rt", encoding="utf-8") as f_in, StreamingJsonlWriter(output_file_path) as writer:
+            for line in f_in:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    writer.write_line(line)
+                    continue
+                if not record.get("text"):
+                    writer.write_line(line)
+                    continue
+
+                stats["num_documents"] += 1
+                paragraphs = record["text"].split("\n")
+                is_blank = np.array([not paragraph.strip() for paragraph in paragraphs], dtype=bool)
+                duplicated = np.zeros(len(paragraphs), dtype=bool)
+                duplicated[~is_blank] = seen_paragraphs.add(
+                    hash_lines(paragraph.strip() for paragraph, blank in zip(paragraphs, is_blank) if not blank)
+                )
+                stats["num_paragraphs"] += int((~is_blank).sum())
+                stats["num_paragraphs_removed"] += int(duplicated.sum())
+
+                text = "\n".join(paragraph for paragraph, removed in zip(paragraphs, duplicated) if not removed)
+                if len(text.strip()) < max(min_document_length, 1):
+                    stats["num_documents_dropped"] += 1
+                    continue
+                writer.write({**record, "text": text})
+
+    print(f"Removed {stats['num_paragraphs_removed']} of {stats['num_paragraphs']} paragraphs")
+    print(f"Dropped {stats['num_documents_dropped']} of {stats['num_documents']} documents")
+    print(f"Bloom filter size: {seen_paragraphs.nbytes / 2**20:.1f} MiB")
+    return stats
+
+def line_hashes_path(shard_directory: str, file_idx: int) -> str:
+    return os.path.join(shard_directory, "line_hashes", f"{file_idx:05d}.npy")
+
+def has_text_path(shard_directory: str, file_idx: int) -> str:
+    return os.path.join(shard_directory, "line_hashes", f"{file_idx:05d}.has_text.npy")
+
+def partition_directory(shard_directory: str, partition_idx: int) -> str:
+    return os.path.join(shard_directory, f"partition_{partition_idx:05d}")
+
+def partition_shard_path(shard_directory: str, partition_idx: int, file_idx: int) -> str:
+    return os.path.join(partition_directory(shard_directory, partition_idx), f"{file_idx:05d}.u64")
+
+def map_line_hashes(input_file: str, shard_directory: str, file_idx: int, num_partitions: int) -> int:
+    """
+    Mapper: decompresses and parses `input_file` once. The hash of every line is saved so the filtering
+    pass does not need to parse JSON again, and the file's distinct hashes are written to one shard per
+    hash range. Hashes repeated within the file are written twice, so the reducer counts them as duplicates.
+    """
+    hashes = []
+    has_text = []
+    with gzip.open(input_file, "rt", encoding="utf-8") as f_in:
+        for lines in iter_line_chunks(f_in):
+            texts = parse_texts(lines)
+            hashes.append(hash_lines(text or "" for text in texts))
+            has_text.append(np.array([text is not None for text in texts], dtype=bool))
+    hashes = np.concatenate(hashes) if hashes else np.array([], dtype=np.uint64)
+    has_text = np.concatenate(has_text) if has_text else np.array([], dtype=bool)
+
+    os.makedirs(os.path.dirname(line_hashes_path(shard_directory, file_idx)), exist_ok=True)
+    np.save(line_hashes_path(shard_directory, file_idx), hashes)
+    np.save(has_text_path(shard_directory, file_idx), has_text)
+
+    unique, counts = np.unique(hashes[has_text], return_counts=True)
+    bounds = partition_bounds(unique, num_partitions)
+    for partition_idx in range(num_partitions):
+        partition_hashes = unique[bounds[partition_idx]:bounds[partition_idx + 1]]
+        partition_counts = counts[bounds[partition_idx]:bounds[partition_idx + 1]]
+        shard_path = partition_shard_path(shard_directory, partition_idx, file_idx)
+        if len(partition_hashes) == 0:
+            # A shard with this name may be left over from an earlier run over other files
+            if os.path.exists(shard_path):
+                os.remove(shard_path)
+            continue
+        os.makedirs(partition_directory(shard_directory, partition_idx), exist_ok=True)
+        with open(shard_path, "wb") as f_shard:
+            np.concatenate([partition_hashes, partition_hashes[partition_counts > 1]]).tofile(f_shard)
+    return len(hashes)
+
+def reduce_partition(shard_directory: str, partition_idx: int, num_files: int) -> tuple[int, int]:
+    """
+    Reducer: merges the shards that the mappers of this run's `num_files` files wrote for one hash range, and
+    writes the hashes seen more than once. Other files in the directory are ignored.
+    """
+    directory = partition_directory(shard_directory, partition_idx)
+    shard_paths = [partition_shard_path(shard_directory, partition_idx, file_idx) for file_idx in range(num_files)]
+    shard_paths = [shard_path for shard_path in shard_paths if os.path.exists(shard_path)]
+    hashes = [np.fromfile(shard_path, dtype=np.uint64) for shard_path in shard_paths]
+    unique, counts = np.unique(np.concatenate(hashes) if hashes else np.array([], dtype=np.uint64), return_counts=True)
+
+    os.makedirs(directory, exist_ok=True)
+    unique[counts > 1].tofile(os.path.join(directory, "duplicates.u64"))
+    return len(unique), int((counts > 1).sum())
+
+def load_duplicates(shard_directory: str, partition_idx: int) -> np.ndarray:
+    return np.fromfile(os.path.join(partition_directory(shard_directory, partition_idx), "duplicates.u64"), dtype=np.uint64)
+
+def filter_file(input_file: str, output_path: str, shard_directory: str, file_idx: int, num_partitions: int) -> int:
+    """Filtering task: drops the lines of `input_file` whose text was seen more than once, using the saved hashes."""
+    input_file_basename = os.path.basename(input_file)
+    output_file_path = os.path.join(output_path, input_file_basename)
+    if os.path.exists(f"{output_file_path}.SUCCESS"):
+        print(f"Skipping {input_file} because it has already been deduplicated")
+        return 0
+
+    hashes = np.load(line_hashes_path(shard_directory, file_idx))
+    has_text = np.load(has_text_path(shard_directory, file_idx))
+    # Only the duplicates of the hash ranges this file's lines fall into are loaded
+    line_partitions = partition_ids(hashes, num_partitions)
+    duplicated = np.zeros(len(hashes), dtype=bool)
+    for partition_idx in np.unique(line_partitions[has_text]).tolist():
+        in_partition = has_text & (line_partitions == partition_idx)
+        duplicated[in_partition] = is_duplicate(hashes[in_partition], load_duplicates(shard_directory, partition_idx))
+
+    with gzip.open(output_file_path, "wt", encoding="utf-8") as f_out:
+        with gzip.open(input_file, "rt", encoding="utf-8") as f_in:
+            for line, line_duplicated in zip(f_in, duplicated):
+                if not line_duplicated:
+                    f_out.write(line)
+
+    with gzip.open(f"{output_file_path}.SUCCESS", "wt", encoding="utf-8") as f_out_deduped:
+        f_out_deduped.write(f"Deduplicated {input_file} -> {output_file_path}\n")
+    return int(duplicated.sum())
+
+def exact_line_deduplication_warc_mapreduce(
+    input_files: list[str],
+    output_path: str,
+    shard_directory: str,
+    num_partitions: int = 64,
+    backend: Backend = "local",
+    num_workers: int | None = None,
+):
+    """
+    Same output as `exact_line_deduplication_warc`, computed as three rounds of parallel tasks: one mapper
+    per input file, one reducer per hash range, and one filtering task per input file. With the "slurm"
+    backend, `shard_directory` must be on a filesystem shared by all nodes.
+    """
+    os.makedirs(output_path, exist_ok=True)
+
+    run_tasks(
+        map_line_hashes,
+        [(input_file, shard_directory, file_idx, num_partitions) for file_idx, input_file in enumerate(input_files)],
+        backend,
+        num_workers,
+        desc="Hashing",
+    )
+    reduce_results = run_tasks(
+        reduce_partition,
+        [(shard_directory, partition_idx, len(input_files)) for partition_idx in range(num_partitions)],
+        backend,
+        num_workers,
+        desc="Counting",
+    )
+    num_duplicated = run_tasks(
+        filter_file,
+        [
+            (input_file, output_path, shard_directory, file_idx, num_partitions)
+            for file_idx, input_file in enumerate(input_files)
+        ],
+        backend,
+        num_workers,
+        desc="Deduplicating",
+    )
+
+    print(f"Number of duplicated documents removed: {sum(num_duplicated)}")
+    print(f"Number of documents: {sum(num_unique for num_unique, _ in reduce_results)}")
 
 @draccus.wrap()
 def main(config: Config):
@@ -74,7 +293,22 @@ def main(config: Config):
         return
     
     print(f"Found {len(input_files)} files to process")
-    exact_line_deduplication_warc(input_files, config.output_dir)
+    if config.mode == "paragraph":
+        paragraph_deduplication_warc(
+            input_files,
+            config.output_dir,
+            config.bloom_error_rate,
+            config.bloom_initial_capacity,
+            config.bloom_max_bytes,
+            config.min_document_length,
+        )
+    elif config.mode == "mapreduce":
+        shard_directory = config.shard_directory or f"{config.output_dir.rstrip('/')}-shards"
+        exact_line_deduplication_warc_mapreduce(
+            input_files, config.output_dir, shard_directory, config.num_partitions, config.backend, config.num_workers
+        )
+    else:
+        exact_line_deduplication_warc(input_files, config.output_dir, config.memory_limit, config.spill_directory)
     print("Deduplication complete!")
 
 if __name__ == "__main__":
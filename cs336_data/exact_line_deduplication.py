@@ -1,29 +1,57 @@
 import os
-import hashlib
-from collections import Counter
+from itertools import islice
+import numpy as np
+from cs336_data.dedup_index import DedupIndex
+from cs336_data.line_hash_index import LineHashCounter, hash_lines, is_duplicate
 
-def exact_line_deduplication(input_files: list[str], output_path: str):
-    os.makedirs(output_path, exist_ok=True)
+# Number of lines hashed together
+CHUNK_SIZE = 100_000
 
+def iter_line_chunks(f_in, chunk_size: int = CHUNK_SIZE):
+    while chunk := list(islice(f_in, chunk_size)):
+        yield chunk
 
-    counts = Counter()
-    for input_file in input_files:
-        input_file_basename = os.path.basename(input_file)
-        with open(input_file, "r") as f_in:
-            for line in f_in:
-                line_hash = hashlib.sha256(line.encode()).hexdigest()
-                counts[line_hash] += 1
+def exact_line_deduplication(
+    input_files: list[str],
+    output_path: str,
+    memory_limit: int = 1 << 30,
+    spill_directory: str | None = None,
+    index_directory: str | None = None,
+):
+    """
+    Removes every line that occurs more than once across `input_files`. Lines are counted by 64-bit
+    hash in a `LineHashCounter`, which spills to `spill_directory` once it exceeds `memory_limit` bytes.
+
+    With an `index_directory`, lines already counted in that `DedupIndex` by earlier runs are removed as
+    well, and this batch's line counts are added to it afterwards.
+    """
+    os.makedirs(output_path, exist_ok=True)
+    index = DedupIndex.open(index_directory) if index_directory is not None else None
+
+    with LineHashCounter(memory_limit, spill_directory=spill_directory) as counts:
+        for input_file in input_files:
+            with open(input_file, "r") as f_in:
+                for lines in iter_line_chunks(f_in):
+                    counts.add(hash_lines(lines))
+        if index is None:
+            duplicates = counts.duplicates()
+        else:
+            batch_hashes, batch_counts, duplicates = [np.zeros(0, dtype=np.uint64)], [np.zeros(0, dtype=np.uint64)], []
+            for unique, unique_counts in counts.iter_counts():
+                duplicates.append(unique[(unique_counts > 1) | (index.line_counts(unique) > 0)])
+                batch_hashes.append(unique)
+                batch_counts.append(unique_counts)
+            duplicates = np.concatenate(duplicates) if duplicates else np.zeros(0, dtype=np.uint64)
 
-    
     for input_file in input_files:
         input_file_basename = os.path.basename(input_file)
         output_file_path = os.path.join(output_path, input_file_basename)
         with open(output_file_path, "w") as f_out:
             with open(input_file, "r") as f_in:
-                for line in f_in:
-                    line_hash = hashlib.sha256(line.encode()).hexdigest()
-                    if counts[line_hash] > 1:
-                        continue
-                    else:
-                        f_out.write(line)
-                    
\ No newline at end of file
+                for lines in iter_line_chunks(f_in):
+                    for line, duplicated in zip(lines, is_duplicate(hash_lines(lines), duplicates)):
+                        if not duplicated:
+                            f_out.write(line)
+
+    if index is not None:
+        index.add(line_hashes=np.concatenate(batch_hashes), line_counts=np.concatenate(batch_counts))
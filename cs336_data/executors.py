@@ -0,0 +1,60 @@
+import multiprocessing
+from typing import Any, Callable, Literal
+
+Backend = Literal["slurm", "local"]
+
+# Defaults for CPU jobs on the course cluster; any of them can be overridden per call
+SLURM_PARAMETERS = {
+    "timeout_min": 30,
+    "mem_gb": 4,
+    "cpus_per_task": 1,
+    "slurm_partition": "a4-cpu",
+    "slurm_qos": "a4-cpu-qos",
+    "stderr_to_stdout": True,
+}
+MAX_SIMULTANEOUS_JOBS = 12
+
+
+def _call(function_and_args: tuple[Callable, tuple]) -> Any:
+    function, args = function_and_args
+    return function(*args)
+
+
+def run_tasks(
+    function: Callable,
+    tasks: list[tuple],
+    backend: Backend = "local",
+    num_workers: int | None = None,
+    desc: str | None = None,
+    **slurm_parameters,
+) -> list:
+    """
+    Runs `function(*task)` for every task and returns the results in task order.
+
+    The "slurm" backend submits the tasks as one submitit job array with at most `num_workers` jobs running
+    at once; the "local" backend runs them on a forkserver process pool with `num_workers` processes.
+    """
+    from tqdm import tqdm
+
+    if backend == "local":
+        context = multiprocessing.get_context("forkserver")
+        with context.Pool(num_workers) as pool:
+            return list(tqdm(pool.imap(_call, [(function, task) for task in tasks]), total=len(tasks), desc=desc))
+
+    if backend == "slurm":
+        import submitit
+
+        executor = submitit.AutoExecutor(folder="slurm_outputs")
+        executor.update_parameters(
+            slurm_array_parallelism=num_workers or MAX_SIMULTANEOUS_JOBS,
+            **{**SLURM_PARAMETERS, **slurm_parameters},
+        )
+        # Use executor.batch() context manager to group all of the jobs in a Slurm array
+        with executor.batch():
+            futures = [executor.submit(function, *task) for task in tasks]
+        for future in tqdm(submitit.helpers.as_completed(futures), total=len(futures), desc=desc):
+            # Surface the first failure as soon as it happens
+            future.result()
+        return [future.result() for future in futures]
+
+    raise ValueError(f"Unknown backend: {backend}")
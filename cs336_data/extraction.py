@@ -1,16 +1,98 @@
+import codecs
+import importlib
+import re
+from functools import lru_cache
+
 from resiliparse.extract.html2text import extract_plain_text
 from resiliparse.parse.encoding import detect_encoding
 
-def extract_text_from_html_bytes(html_bytes: bytes | str):
-    if isinstance(html_bytes, str):
-        return html_bytes
+# Bytes searched for a <meta charset> or <meta http-equiv="Content-Type"> declaration
+META_CHARSET_SEARCH_BYTES = 4096
+CONTENT_TYPE_CHARSET_REGEX = re.compile(r"""charset\s*=\s*["']?\s*([\w.:-]+)""", re.IGNORECASE)
+META_CHARSET_REGEX = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([\w.:-]+)""", re.IGNORECASE)
+# Labels that browsers decode as windows-1252, as the WHATWG Encoding Standard requires
+WINDOWS_1252_ALIASES = {"iso8859-1", "ascii"}
+
+
+def codec_name(charset: str | bytes | None) -> str | None:
+    """Python's codec name for a declared charset, or None when it is missing or unknown."""
+    if isinstance(charset, bytes):
+        charset = charset.decode("ascii", errors="ignore")
+    if not charset:
+        return None
+    try:
+        name = codecs.lookup(charset).name
+    except LookupError:
+        return None
+    return "cp1252" if name in WINDOWS_1252_ALIASES else name
+
+
+@lru_cache(maxsize=None)
+def is_single_byte_codec(name: str) -> bool:
+    """Whether `name` (as returned by `codec_name`) maps every byte to one character, so decoding never fails on
+    the wrong kind of text. Python implements these codecs with a decoding table."""
+    try:
+        module = importlib.import_module(f"encodings.{name.replace('-', '_')}")
+    except ImportError:
+        return False
+    return hasattr(module, "decoding_table")
+
+
+def declared_charset(html_bytes: bytes, content_type: str | None = None) -> str | None:
+    """The charset from the HTTP `Content-Type` header, else from a <meta> tag in the first few KB."""
+    if content_type and (match := CONTENT_TYPE_CHARSET_REGEX.search(content_type)):
+        if charset := codec_name(match.group(1)):
+            return charset
+    if match := META_CHARSET_REGEX.search(html_bytes, 0, META_CHARSET_SEARCH_BYTES):
+        return codec_name(match.group(1))
+    return None
+
+
+def decode_html_bytes(html_bytes: bytes, content_type: str | None = None) -> str:
+    """
+    Decodes with the declared charset when the data agrees with it, and otherwise (or when no charset is
+    declared) with the encoding detected over the whole document, replacing invalid bytes. A multi-byte
+    declaration such as utf-8 agrees when the bytes decode strictly. Any bytes decode in a single-byte
+    charset, so such a declaration is only used when detection also finds a single-byte encoding; UTF-8 pages
+    mislabeled as iso-8859-1 are common.
+    """
+    charset = declared_charset(html_bytes, content_type)
+    if charset is not None and not is_single_byte_codec(charset):
+        try:
+            return html_bytes.decode(charset)
+        except UnicodeDecodeError:
+            # The declaration contradicts the data
+            pass
 
     try:
-        enc = detect_encoding(html_bytes)
-        html_str = html_bytes.decode(enc, errors='replace')
+        enc = codec_name(detect_encoding(html_bytes)) or "utf-8"
+        if charset is not None and is_single_byte_codec(charset) and is_single_byte_codec(enc):
+            enc = charset
+        return html_bytes.decode(enc, errors='replace')
     except Exception as e:
         raise Exception(f"Error decoding HTML: {e}, html_bytes: {html_bytes}")
 
-    return extract_plain_text(html_str)
-    
-    
\ No newline at end of file
+
+def extract_text_from_html_bytes(html_bytes: bytes | str, content_type: str | None = None):
+    """
+    Extracts the plain text of an HTML document. `content_type` is the HTTP `Content-Type` header, if
+    known, whose charset takes precedence over the document's own declaration.
+    """
+    if isinstance(html_bytes, str):
+        return html_bytes
+
+    return extract_plain_text(decode_html_bytes(html_bytes, content_type))
+
+
+def extract_texts_from_html_bytes(
+    html_bytes_list: list[bytes | str],
+    content_types: list[str | None] | None = None,
+    num_threads: int | None = None,
+) -> list[str]:
+    """`extract_text_from_html_bytes` over many documents on a thread pool; resiliparse releases the GIL."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    if content_types is None:
+        content_types = [None] * len(html_bytes_list)
+    with ThreadPoolExecutor(num_threads) as executor:
+        return list(executor.map(extract_text_from_html_bytes, html_bytes_list, content_types))
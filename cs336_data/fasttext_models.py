@@ -0,0 +1,53 @@
+import os
+from functools import lru_cache
+
+import numpy as np
+
+# Model name -> (environment variable overriding the path, default path). The classifiers are loaded
+# lazily and cached per process, so importing a module that uses them never touches the filesystem.
+MODEL_PATHS = {
+    "language": ("CS336_LANGUAGE_MODEL_PATH", "/data/classifiers/lid.176.bin"),
+    "hate": ("CS336_HATESPEECH_MODEL_PATH", "/data/classifiers/dolma_fasttext_hatespeech_jigsaw_model.bin"),
+    "nsfw": ("CS336_NSFW_MODEL_PATH", "/data/classifiers/dolma_fasttext_nsfw_jigsaw_model.bin"),
+    "quality": ("CS336_QUALITY_MODEL_PATH", "fasttext_model.bin"),
+}
+
+_path_overrides: dict[str, str] = {}
+
+def model_path(name: str) -> str:
+    if name not in MODEL_PATHS:
+        raise ValueError(f"Unknown model: {name}")
+    if name in _path_overrides:
+        return _path_overrides[name]
+    env_var, default_path = MODEL_PATHS[name]
+    return os.environ.get(env_var, default_path)
+
+def set_model_path(name: str, path: str):
+    """Overrides the path of `name` (e.g. from a config file), taking precedence over the environment."""
+    if name not in MODEL_PATHS:
+        raise ValueError(f"Unknown model: {name}")
+    _path_overrides[name] = path
+    load_model.cache_clear()
+
+@lru_cache
+def load_model(name: str):
+    import fasttext
+
+    return fasttext.load_model(model_path(name))
+
+def clean_label(label: str) -> str:
+    return label.replace("__label__", "")
+
+def predict_batch(model, flat_texts: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Run a single `predict` call over `flat_texts`, which must not contain newlines.
+
+    Returns an array of labels (without the `__label__` prefix) and an array of their probabilities.
+    """
+    if not flat_texts:
+        return np.array([], dtype=str), np.array([], dtype=np.float64)
+
+    labels, probabilities = model.predict(flat_texts, k=1)
+
+    cleaned_labels = np.array([clean_label(label[0]) for label in labels])
+    cleaned_probabilities = np.array([probability[0] for probability in probabilities], dtype=np.float64)
+    return cleaned_labels, cleaned_probabilities
@@ -1,6 +1,4 @@
-from cs336_data.gopher import check_gopher_filters
-from cs336_data.language_identification import identify_language
-from cs336_data.nsfw_detection import classify
+from cs336_data.filter_pipeline import FilterPipeline, default_stages
 from dataclasses import dataclass
 import draccus
 
@@ -9,15 +7,29 @@ import draccus
 class CleanSamplesConfig:
     input_path: str
     output_path: str
+    # Number of samples per classifier `predict` call
+    batch_size: int = 256
+
+
+def write_kept_lines(pipeline: FilterPipeline, batch: list[tuple[str, str]], f_out) -> int:
+    documents = pipeline.filter_batch([text for _, text in batch])
+    num_kept = 0
+    for (line, _), document in zip(batch, documents):
+        if document.rejected_by is None:
+            f_out.write(line)
+            num_kept += 1
+    return num_kept
 
 
 @draccus.wrap()
 def main(config: CleanSamplesConfig):
+    pipeline = FilterPipeline(default_stages(include_quality=False))
 
     num_total_samples = 0
     num_filtered_samples = 0
     with open(config.input_path, "r") as f_in:
         with open(config.output_path, "w") as f_out:
+            batch = []
             for i, line in enumerate(f_in):
                 num_total_samples += 1
                 label_plus_text = line.strip().split(" ", 1)
@@ -25,25 +37,17 @@ def main(config: CleanSamplesConfig):
                     continue
 
                 label, text = label_plus_text
-                language, _ = identify_language(text)
-                if language != "en":
-                    continue
-                
-                toxic_flag, _ = classify(text, "hate")
-                nsfw_flag, _ = classify(text, "nsfw")
-                if toxic_flag == "toxic" or nsfw_flag == "nsfw":
-                    continue
-                
-                gopher_flag_to_keep = check_gopher_filters(text)
-                if not gopher_flag_to_keep:
-                    continue
-                
-                f_out.write(line)
-                num_filtered_samples += 1
+                batch.append((line, text))
+                if len(batch) >= config.batch_size:
+                    num_filtered_samples += write_kept_lines(pipeline, batch, f_out)
+                    batch = []
+
+            if batch:
+                num_filtered_samples += write_kept_lines(pipeline, batch, f_out)
 
     print(f"Total samples: {num_total_samples}")
     print(f"Filtered samples: {num_filtered_samples}")
     print(f"Yield: {num_filtered_samples / num_total_samples}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,201 @@
+import time
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Callable
+
+import numpy as np
+
+from cs336_data.fasttext_models import load_model, predict_batch
+from cs336_data.gopher import GopherStats, GopherTokenizer, check_gopher_filters_with_stats, tokenize
+
+
+@dataclass
+class Document:
+    """
+    A document flowing through a `FilterPipeline`. Derived views of the text are computed at most
+    once and shared by every stage that needs them.
+    """
+    text: str
+    # Stage name -> (label, probability) for the classifier stages that have seen this document
+    predictions: dict[str, tuple[str, float]] = field(default_factory=dict)
+    gopher_stats: GopherStats | None = None
+    rejected_by: str | None = None
+
+    @cached_property
+    def flat_text(self) -> str:
+        return self.text.replace("\n", " ")
+
+    @cached_property
+    def words(self) -> list[str]:
+        return tokenize(self.text, "nltk")
+
+    @cached_property
+    def lines(self) -> list[str]:
+        return self.text.split("\n")
+
+
+@dataclass
+class FilterStage:
+    """
+    A single filter. `predict` takes a batch of documents and returns a boolean mask of the ones to keep.
+    The stage keeps running totals of its cost and rejection rate so the pipeline can reorder stages.
+    """
+    name: str
+    predict: Callable[[list[Document]], np.ndarray]
+    num_seen: int = 0
+    num_rejected: int = 0
+    total_seconds: float = 0.0
+
+    def __call__(self, documents: list[Document]) -> np.ndarray:
+        start_time = time.perf_counter()
+        keep = np.asarray(self.predict(documents), dtype=bool)
+        self.total_seconds += time.perf_counter() - start_time
+
+        self.num_seen += len(documents)
+        self.num_rejected += int((~keep).sum())
+        return keep
+
+    @property
+    def rejection_rate(self) -> float:
+        return self.num_rejected / self.num_seen if self.num_seen else 0.0
+
+    @property
+    def seconds_per_document(self) -> float:
+        return self.total_seconds / self.num_seen if self.num_seen else 0.0
+
+    @property
+    def priority(self) -> float:
+        """Expected seconds spent per rejected document; cheap, selective stages have the lowest priority."""
+        if self.rejection_rate == 0.0:
+            return float("inf")
+        return self.seconds_per_document / self.rejection_rate
+
+
+class FilterPipeline:
+    """
+    Runs a chain of `FilterStage`s over batches of documents, short-circuiting each document at the
+    first stage that rejects it.
+
+    When `reorder` is set, the stages are re-sorted by `FilterStage.priority` every `reorder_interval`
+    documents once the pipeline has processed at least `min_samples` documents, so cheap, highly
+    selective filters run first. Each stage is ranked on the documents it has seen so far: late stages
+    only see what earlier ones kept, so waiting for all of them to reach `min_samples` could postpone
+    reordering forever. Stages that have not seen any document yet rank last. The set of kept documents
+    does not depend on the order; only the per-stage filtered counts do, since a document is only
+    counted against the first stage that rejects it.
+    """
+
+    def __init__(
+        self,
+        stages: list[FilterStage],
+        reorder: bool = True,
+        reorder_interval: int = 1000,
+        min_samples: int = 100,
+    ):
+        self.stages = list(stages)
+        self.reorder = reorder
+        self.reorder_interval = reorder_interval
+        self.min_samples = min_samples
+        self.number_total = 0
+        self.number_kept = 0
+        self._documents_since_reorder = 0
+
+    def filter_batch(self, texts: list[str]) -> list[Document]:
+        """Filters a batch of texts, returning one `Document` per input with `rejected_by` set on rejected ones."""
+        documents = [Document(text) for text in texts]
+
+        remaining = documents
+        for stage in self.stages:
+            if not remaining:
+                break
+            keep = stage(remaining)
+            for document, keep_document in zip(remaining, keep):
+                if not keep_document:
+                    document.rejected_by = stage.name
+            remaining = [document for document, keep_document in zip(remaining, keep) if keep_document]
+
+        self.number_total += len(documents)
+        self.number_kept += len(remaining)
+        self._documents_since_reorder += len(documents)
+        if self.reorder and self._documents_since_reorder >= self.reorder_interval:
+            self._reorder_stages()
+        return documents
+
+    def keep(self, text: str) -> bool:
+        return self.filter_batch([text])[0].rejected_by is None
+
+    def _reorder_stages(self):
+        self._documents_since_reorder = 0
+        if self.number_total >= self.min_samples:
+            # sort is stable, so stages with equal priority keep their relative order
+            self.stages.sort(key=lambda stage: stage.priority)
+
+    def stats(self) -> dict[str, int]:
+        resp = {f"{stage.name}_filtered_count": stage.num_rejected for stage in self.stages}
+        resp["number_kept"] = self.number_kept
+        resp["number_total"] = self.number_total
+        return resp
+
+    def batch_stats(self, documents: list[Document]) -> dict[str, int]:
+        """The same counts as `stats`, restricted to `documents` returned by `filter_batch`."""
+        resp = {f"{stage.name}_filtered_count": 0 for stage in self.stages}
+        for document in documents:
+            if document.rejected_by is not None:
+                resp[f"{document.rejected_by}_filtered_count"] += 1
+        resp["number_kept"] = sum(1 for document in documents if document.rejected_by is None)
+        resp["number_total"] = len(documents)
+        return resp
+
+
+def language_stage(language: str = "en") -> FilterStage:
+    def predict(documents: list[Document]) -> np.ndarray:
+        labels, probabilities = predict_batch(load_model("language"), [document.flat_text for document in documents])
+        for document, label, probability in zip(documents, labels, probabilities):
+            document.predictions["english"] = (str(label), float(probability))
+        return labels == language
+
+    return FilterStage("english", predict)
+
+
+def gopher_stage(tokenizer: GopherTokenizer = "fast") -> FilterStage:
+    def predict(documents: list[Document]) -> np.ndarray:
+        keep = np.zeros(len(documents), dtype=bool)
+        for i, document in enumerate(documents):
+            words = document.words if tokenizer == "nltk" else None
+            keep[i], document.gopher_stats = check_gopher_filters_with_stats(
+                document.text, words, document.lines, tokenizer
+            )
+        return keep
+
+    return FilterStage("gopher", predict)
+
+
+def harmful_content_stage(harm_type: str) -> FilterStage:
+    # Stage names and rejected labels match the keys of the `.stats` files
+    name = {"hate": "toxic", "nsfw": "nsfw"}[harm_type]
+
+    def predict(documents: list[Document]) -> np.ndarray:
+        labels, probabilities = predict_batch(load_model(harm_type), [document.flat_text for document in documents])
+        for document, label, probability in zip(documents, labels, probabilities):
+            document.predictions[name] = (str(label), float(probability))
+        return labels != name
+
+    return FilterStage(name, predict)
+
+
+def quality_stage() -> FilterStage:
+    def predict(documents: list[Document]) -> np.ndarray:
+        labels, probabilities = predict_batch(load_model("quality"), [document.flat_text for document in documents])
+        for document, label, probability in zip(documents, labels, probabilities):
+            document.predictions["quality"] = (str(label), float(probability))
+        return labels != "lq"
+
+    return FilterStage("quality", predict)
+
+
+def default_stages(include_quality: bool = True) -> list[FilterStage]:
+    """The language -> Gopher -> hate -> NSFW -> quality chain used throughout the package."""
+    stages = [language_stage(), gopher_stage(), harmful_content_stage("hate"), harmful_content_stage("nsfw")]
+    if include_quality:
+        stages.append(quality_stage())
+    return stages
@@ -0,0 +1,102 @@
+import json
+import os
+from collections import Counter
+
+
+class StreamingJsonlWriter:
+    """
+    Writes JSONL records to `<output_path>.tmp` as they are produced, flushing every `flush_interval`
+    records, and atomically renames the temporary file to `output_path` on `commit`. Memory use does not
+    depend on the number of records, and readers never see a partially written output.
+
+    Used as a context manager, the output is committed when the block exits normally and the temporary
+    file is removed when it raises, unless `remove_on_error` is unset so a later run can resume it.
+
+    `checkpoint` returns a byte offset at which the temporary file is complete (for gzip outputs, every
+    checkpoint ends a gzip member). Passing that offset back as `resume_from_bytes` truncates anything
+    written after the checkpoint and appends to the temporary file instead of starting over.
+    """
+
+    def __init__(
+        self,
+        output_path: str,
+        flush_interval: int = 1000,
+        resume_from_bytes: int | None = None,
+        remove_on_error: bool = True,
+    ):
+        self.output_path = output_path
+        self.temporary_path = f"{output_path}.tmp"
+        self.flush_interval = flush_interval
+        self.remove_on_error = remove_on_error
+        self.num_written = 0
+        # fsspec is imported when a writer is created, which keeps importing this module cheap
+        from fsspec.utils import infer_compression
+
+        self._compression = infer_compression(output_path)
+        if resume_from_bytes is None:
+            self._open("w")
+        else:
+            os.truncate(self.temporary_path, resume_from_bytes)
+            self._open("a")
+
+    def _open(self, mode: str):
+        import fsspec
+
+        self._open_file = fsspec.open(self.temporary_path, mode, compression=self._compression)
+        self._f_out = self._open_file.open()
+
+    def write(self, record: dict):
+        self.write_line(json.dumps(record))
+
+    def write_line(self, line: str):
+        """Writes an already serialized record, e.g. one copied verbatim from another JSONL file."""
+        self._f_out.write(line.rstrip("\n") + "\n")
+        self.num_written += 1
+        if self.num_written % self.flush_interval == 0:
+            self._f_out.flush()
+
+    def checkpoint(self) -> int:
+        self._open_file.close()
+        num_bytes = os.path.getsize(self.temporary_path)
+        self._open("a")
+        return num_bytes
+
+    def commit(self):
+        self._open_file.close()
+        os.replace(self.temporary_path, self.output_path)
+
+    def abort(self, remove: bool = True):
+        self._open_file.close()
+        if remove and os.path.exists(self.temporary_path):
+            os.remove(self.temporary_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort(remove=self.remove_on_error)
+
+
+def write_json_atomically(path: str, data: dict):
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w") as f_out:
+        json.dump(data, f_out)
+    os.replace(temporary_path, path)
+
+
+def merge_stats(*stats: dict[str, int]) -> dict[str, int]:
+    merged = Counter()
+    for partial_stats in stats:
+        merged.update(partial_stats)
+    return dict(merged)
+
+
+def write_stats_and_success(basename_without_extensions: str, input_path: str, stats: dict[str, int]):
+    with open(f"{basename_without_extensions}.stats", "w") as f_stats:
+        f_stats.write(json.dumps(stats))
+
+    with open(f"{basename_without_extensions}.SUCCESS", "w") as f_success:
+        f_success.write(f"Successfully processed {input_path}")
@@ -1,11 +1,8 @@
-import fasttext
-from functools import lru_cache
+import numpy as np
+from cs336_data.fasttext_models import load_model, predict_batch
 
-fasttext_model_path = "/data/classifiers/lid.176.bin"
-
-@lru_cache
 def fasttext_model():
-    return fasttext.load_model(fasttext_model_path)
+    return load_model("language")
 
 def identify_language(text: str):
     cleaned_text = text.replace("\n", " ")
@@ -13,4 +10,11 @@ def identify_language(text: str):
     predictions = model.predict(cleaned_text)
 
     cleaned_predictions = (predictions[0][0].replace("__label__", ""), predictions[1][0])
-    return cleaned_predictions
\ No newline at end of file
+    return cleaned_predictions
+
+def identify_language_batch(texts: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Identify the language of many documents with a single `predict` call.
+
+    Returns an array of language codes and an array of their probabilities, aligned with `texts`.
+    """
+    return predict_batch(fasttext_model(), [text.replace("\n", " ") for text in texts])
@@ -0,0 +1,170 @@
+import os
+import shutil
+import tempfile
+from typing import Iterable, Iterator
+
+import mmh3
+import numpy as np
+
+FMIX64_MULTIPLIERS = (np.uint64(0xFF51AFD7ED558CCD), np.uint64(0xC4CEB9FE1A85EC53))
+# Initial state when folding a band of 32-bit MinHash values into one 64-bit bucket key
+BAND_KEY_SEED = np.uint64(0xCBF29CE484222325)
+
+
+def hash_lines(lines: Iterable[str]) -> np.ndarray:
+    """Hashes each line to an unsigned 64-bit MurmurHash3 key.
+
+    With n distinct lines, the expected number of colliding pairs is about n^2 / 2^65 (under one for
+    six billion lines); a collision makes two different lines count as duplicates of each other.
+    """
+    return np.fromiter((mmh3.hash64(line, signed=False)[0] for line in lines), dtype=np.uint64)
+
+
+def is_duplicate(hashes: np.ndarray, duplicates: np.ndarray) -> np.ndarray:
+    """Returns a boolean mask of the `hashes` that appear in the sorted `duplicates` array."""
+    if len(duplicates) == 0:
+        return np.zeros(len(hashes), dtype=bool)
+    positions = np.searchsorted(duplicates, hashes)
+    positions[positions == len(duplicates)] = 0
+    return duplicates[positions] == hashes
+
+
+def fmix64(hashes: np.ndarray) -> np.ndarray:
+    """MurmurHash3's 64-bit finalizer, applied in place."""
+    shift = np.uint64(33)
+    for multiplier in FMIX64_MULTIPLIERS:
+        hashes ^= hashes >> shift
+        hashes *= multiplier
+    hashes ^= hashes >> shift
+    return hashes
+
+
+def band_keys(band: np.ndarray) -> np.ndarray:
+    """
+    Hashes each row of a (num_documents, rows_per_band) MinHash band to a single 64-bit bucket key. Every
+    value is XORed into the state, which `fmix64` then mixes across all 64 bits before the next value.
+    """
+    keys = np.full(len(band), BAND_KEY_SEED, dtype=np.uint64)
+    for column in np.asarray(band, dtype=np.uint64).T:
+        keys ^= column
+        fmix64(keys)
+    return keys
+
+
+def partition_ids(hashes: np.ndarray, num_partitions: int) -> np.ndarray:
+    """The partition of every hash among `num_partitions` (a power of two) ranges, chosen by its top bits."""
+    if num_partitions & (num_partitions - 1):
+        raise ValueError(f"num_partitions must be a power of two, got {num_partitions}")
+    if num_partitions == 1:
+        return np.zeros(len(hashes), dtype=np.uint64)
+    return np.asarray(hashes, dtype=np.uint64) >> np.uint64(65 - num_partitions.bit_length())
+
+
+def partition_bounds(sorted_hashes: np.ndarray, num_partitions: int) -> np.ndarray:
+    """
+    Splits sorted hashes into `num_partitions` (a power of two) ranges by their top bits. Partition `i` is
+    `sorted_hashes[bounds[i]:bounds[i + 1]]`, so every hash always lands in the same partition.
+    """
+    return np.searchsorted(partition_ids(sorted_hashes, num_partitions), np.arange(num_partitions + 1, dtype=np.uint64))
+
+
+def merge_counts(hashes: np.ndarray, counts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Sums the `counts` of equal `hashes`, returning the sorted unique hashes and their total counts."""
+    unique, inverse = np.unique(hashes, return_inverse=True)
+    # np.bincount would sum the weights as float64, which is inexact past 2^53
+    totals = np.zeros(len(unique), dtype=np.uint64)
+    np.add.at(totals, inverse, np.asarray(counts, dtype=np.uint64))
+    return unique, totals
+
+
+class LineHashCounter:
+    """
+    Counts 64-bit line hashes using at most roughly `memory_limit` bytes, e.g. to find the ones that occur
+    more than once.
+
+    Hashes are buffered in NumPy arrays (8 bytes per line instead of a ~150 byte `Counter` entry for a
+    hex digest). When the buffer is full, it is reduced to its unique hashes and their counts, which are
+    spilled to `num_partitions` files on disk by their top bits. Each partition is then counted
+    independently, so it only needs to fit in memory on its own.
+    """
+
+    def __init__(self, memory_limit: int = 1 << 30, num_partitions: int = 256, spill_directory: str | None = None):
+        # np.unique needs room for a sorted copy and the counts next to the buffer
+        self.buffer_capacity = max(memory_limit // (4 * np.dtype(np.uint64).itemsize), 1)
+        self.num_partitions = num_partitions
+        self.spill_directory = spill_directory
+        self.num_unique: int | None = None
+        self._buffer: list[np.ndarray] = []
+        self._num_buffered = 0
+        self._partition_directory: str | None = None
+
+    def add(self, hashes: np.ndarray):
+        self._buffer.append(np.asarray(hashes, dtype=np.uint64))
+        self._num_buffered += len(hashes)
+        if self._num_buffered >= self.buffer_capacity:
+            self._spill()
+
+    def _spill(self):
+        unique, counts = np.unique(np.concatenate(self._buffer), return_counts=True)
+        self._buffer = []
+        self._num_buffered = 0
+
+        if self._partition_directory is None:
+            if self.spill_directory is not None:
+                os.makedirs(self.spill_directory, exist_ok=True)
+            self._partition_directory = tempfile.mkdtemp(prefix="line_hashes_", dir=self.spill_directory)
+
+        boundaries = partition_bounds(unique, self.num_partitions)
+        for partition_idx in range(self.num_partitions):
+            start, end = boundaries[partition_idx], boundaries[partition_idx + 1]
+            if start == end:
+                continue
+            with open(self._partition_path(partition_idx, "u64"), "ab") as f_partition:
+                unique[start:end].tofile(f_partition)
+            with open(self._partition_path(partition_idx, "counts"), "ab") as f_counts:
+                counts[start:end].astype(np.uint64).tofile(f_counts)
+
+    def _partition_path(self, partition_idx: int, extension: str) -> str:
+        return os.path.join(self._partition_directory, f"{partition_idx:05d}.{extension}")
+
+    def iter_counts(self) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+        """
+        Yields (sorted unique hashes, counts) chunks in increasing hash order, one per non-empty partition
+        (or a single chunk when nothing was spilled). Sets `num_unique` once exhausted.
+        """
+        num_unique = 0
+        if self._partition_directory is None:
+            hashes = np.concatenate(self._buffer) if self._buffer else np.array([], dtype=np.uint64)
+            unique, counts = np.unique(hashes, return_counts=True)
+            num_unique = len(unique)
+            yield unique, counts.astype(np.uint64)
+        else:
+            if self._buffer:
+                self._spill()
+            for partition_idx in range(self.num_partitions):
+                partition_path = self._partition_path(partition_idx, "u64")
+                if not os.path.exists(partition_path):
+                    continue
+                unique, counts = merge_counts(
+                    np.fromfile(partition_path, dtype=np.uint64),
+                    np.fromfile(self._partition_path(partition_idx, "counts"), dtype=np.uint64),
+                )
+                num_unique += len(unique)
+                yield unique, counts
+        self.num_unique = num_unique
+
+    def duplicates(self) -> np.ndarray:
+        """Returns the sorted array of hashes added more than once, and sets `num_unique`."""
+        duplicates = [unique[counts > 1] for unique, counts in self.iter_counts()]
+        return np.concatenate(duplicates) if duplicates else np.array([], dtype=np.uint64)
+
+    def close(self):
+        if self._partition_directory is not None:
+            shutil.rmtree(self._partition_directory, ignore_errors=True)
+            self._partition_directory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -1,4 +1,6 @@
 import re
+from functools import lru_cache
+from typing import Callable, Iterable
 
 EMAIL_REGEX = r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}"
 PHONE_NUMBER_REGEX = r"(?:\+1[-.\s]?)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}(?:(?:ext|x|ext\.)\s*\d{2,5})?"
@@ -15,12 +17,45 @@ pii_type_to_regex_and_placeholder_map = {
     "ip_address": (IP_ADDRESS_REGEX, IP_ADDRESS_PLACEHOLDER),
 }
 
-def mask_pii(text: str, pii_type: str):
-    regex, placeholder = pii_type_to_regex_and_placeholder_map[pii_type]
+# Cheap checks for text that cannot contain a match, so the type can be left out of the pattern
+DIGIT_REGEX = re.compile(r"\d")
+DIGIT_DOT_DIGIT_REGEX = re.compile(r"\d\.\d")
+pii_type_to_prefilter_map: dict[str, Callable[[str], bool]] = {
+    "email": lambda text: "@" in text,
+    "phone_number": lambda text: DIGIT_REGEX.search(text) is not None,
+    "ip_address": lambda text: DIGIT_DOT_DIGIT_REGEX.search(text) is not None,
+}
+PII_TYPES = tuple(pii_type_to_regex_and_placeholder_map)
+
+
+@lru_cache(maxsize=None)
+def compile_pii_regex(pii_types: tuple[str, ...]) -> re.Pattern:
+    """One alternation with a group named after each PII type, tried in the given order at every position."""
+    return re.compile(
+        "|".join(f"(?P<{pii_type}>{pii_type_to_regex_and_placeholder_map[pii_type][0]})" for pii_type in pii_types),
+        flags=re.IGNORECASE,
+    )
 
-    found_matches = re.findall(regex, text, flags=re.IGNORECASE)
-    count = len(found_matches)
 
-    modified_text = re.sub(regex, placeholder, text, flags=re.IGNORECASE)
+def mask_all_pii(text: str, types: Iterable[str] = PII_TYPES) -> tuple[str, dict[str, int]]:
+    """
+    Masks every PII type in `types` in a single pass, returning the masked text and the number of matches
+    per type. Types whose prefilter rules out a match are not searched for at all. Where matches of two
+    types overlap, the leftmost wins (the earlier type in `types` on a tie) rather than the first type masked.
+    """
+    types = tuple(types)
+    counts = dict.fromkeys(types, 0)
+    candidate_types = tuple(pii_type for pii_type in types if pii_type_to_prefilter_map[pii_type](text))
+    if not candidate_types:
+        return text, counts
 
-    return (modified_text, count)
+    def replace(match: re.Match) -> str:
+        counts[match.lastgroup] += 1
+        return pii_type_to_regex_and_placeholder_map[match.lastgroup][1]
+
+    return compile_pii_regex(candidate_types).sub(replace, text), counts
+
+
+def mask_pii(text: str, pii_type: str):
+    modified_text, counts = mask_all_pii(text, (pii_type,))
+    return (modified_text, counts[pii_type])
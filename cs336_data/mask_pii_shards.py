@@ -0,0 +1,113 @@
+import os
+import json
+import glob
+import draccus
+import fsspec
+from collections import Counter
+from dataclasses import dataclass, field
+from cs336_data.executors import Backend, run_tasks
+from cs336_data.jsonl_io import StreamingJsonlWriter, merge_stats, write_stats_and_success
+from cs336_data.mask_pii import PII_TYPES, mask_all_pii
+
+@dataclass
+class MaskPiiShardsConfig:
+    input_dir: str = "/data/c-cychou/documents-3-deduped"
+    output_dir: str = "/data/c-cychou/documents-3-masked"
+    pii_types: list[str] = field(default_factory=lambda: list(PII_TYPES))
+    backend: Backend = "local"
+    # Defaults to one worker per CPU locally, or the usual job array parallelism on Slurm
+    num_workers: int | None = None
+    # Flush the output every this many documents
+    flush_interval: int = 1000
+
+def shard_basename(path: str) -> str:
+    return path.split(".jsonl.gz")[0]
+
+def load_stats(basename_without_extensions: str) -> dict[str, int]:
+    """The `.stats` an earlier stage wrote next to a shard, or nothing if it did not write one."""
+    stats_path = f"{basename_without_extensions}.stats"
+    if not os.path.exists(stats_path):
+        return {}
+    with open(stats_path) as f_stats:
+        return json.load(f_stats)
+
+def mask_pii_shard(
+    input_path: str,
+    output_path: str,
+    pii_types: list[str] = PII_TYPES,
+    flush_interval: int = 1000,
+) -> dict[str, int]:
+    """
+    Rewrites one `.jsonl.gz` shard with the PII in each record's "text" masked, streaming it record by record.
+    Records without PII (and lines that are not JSON) are copied verbatim. The `.stats` written next to the
+    output carry over those of the input shard, plus a `<type>_masked_count` per PII type and the number of
+    documents with any PII in `number_masked_documents`.
+    """
+    basename_without_extensions = shard_basename(output_path)
+    if os.path.exists(f"{basename_without_extensions}.SUCCESS"):
+        print(f"Skipping {input_path} because it has already been masked at {basename_without_extensions}.SUCCESS")
+        return load_stats(basename_without_extensions)
+
+    stats = Counter({f"{pii_type}_masked_count": 0 for pii_type in pii_types})
+    stats["number_masked_documents"] = 0
+    with StreamingJsonlWriter(output_path, flush_interval) as writer:
+        with fsspec.open(input_path, "rt", compression="infer") as f_in:
+            for line in f_in:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    writer.write_line(line)
+                    continue
+                masked_text, counts = mask_all_pii(record.get("text") or "", pii_types)
+                if not any(counts.values()):
+                    writer.write_line(line)
+                    continue
+                stats["number_masked_documents"] += 1
+                for pii_type, count in counts.items():
+                    stats[f"{pii_type}_masked_count"] += count
+                writer.write({**record, "text": masked_text})
+
+    stats = merge_stats(load_stats(shard_basename(input_path)), stats)
+    write_stats_and_success(basename_without_extensions, input_path, stats)
+    return stats
+
+def mask_pii_shards(
+    input_files: list[str],
+    output_dir: str,
+    pii_types: list[str] = PII_TYPES,
+    backend: Backend = "local",
+    num_workers: int | None = None,
+    flush_interval: int = 1000,
+) -> dict[str, int]:
+    """Masks every shard in its own task and returns the summed stats."""
+    os.makedirs(output_dir, exist_ok=True)
+    shard_stats = run_tasks(
+        mask_pii_shard,
+        [
+            (input_file, os.path.join(output_dir, os.path.basename(input_file)), pii_types, flush_interval)
+            for input_file in input_files
+        ],
+        backend,
+        num_workers,
+        desc="Masking PII",
+    )
+    stats = merge_stats(*shard_stats)
+    for pii_type in pii_types:
+        print(f"Masked {stats.get(f'{pii_type}_masked_count', 0)} {pii_type} matches")
+    print(f"Masked PII in {stats.get('number_masked_documents', 0)} documents")
+    return stats
+
+@draccus.wrap()
+def main(config: MaskPiiShardsConfig):
+    input_files = sorted(glob.glob(os.path.join(config.input_dir, "*.jsonl.gz")))
+    if not input_files:
+        print(f"No .jsonl.gz files found in {config.input_dir}")
+        return
+
+    print(f"Found {len(input_files)} files to process")
+    mask_pii_shards(
+        input_files, config.output_dir, config.pii_types, config.backend, config.num_workers, config.flush_interval
+    )
+
+if __name__ == "__main__":
+    main()
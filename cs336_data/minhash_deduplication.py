@@ -1,22 +1,58 @@
+import json
 import os
+import shutil
 import string
 import re
+import tempfile
 import unicodedata
+from contextlib import nullcontext
+from functools import lru_cache
+from collections import Counter, OrderedDict
+from typing import Callable, Iterable, Iterator, Literal
 import mmh3
+import numpy as np
+from cs336_data.dedup_index import DedupIndex
+from cs336_data.executors import Backend, run_tasks
+from cs336_data.jsonl_io import StreamingJsonlWriter, write_json_atomically
+from cs336_data.line_hash_index import band_keys, fmix64
+
+# Universal hashing h(x) = ((a * x + b) mod p) mod 2^32 over 32-bit shingle hashes. With a, b and x all
+# below 2^32, a * x + b stays below 2^64, so the products never overflow uint64.
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+# Window hash of a shingle: a polynomial over its code points (or token hashes) modulo 2^64, followed by
+# the MurmurHash3 64-bit finalizer so that the low bits used for MinHash are well mixed
+SHINGLE_HASH_BASE = np.uint64(0x9E3779B97F4A7C15)
+# Candidate edges verified at once
+EDGE_BLOCK_SIZE = 1 << 16
+# "pairs" verifies every colliding pair; "union_find" clusters bucket members without materializing the pairs
+Clustering = Literal["pairs", "union_find"]
+# Shingles permuted at once, bounding the (block size x num_hashes) intermediate array
+SIGNATURE_BLOCK_SIZE = 4096
+
+PUNCTUATION_TABLE = str.maketrans('', '', string.punctuation)
+WHITESPACE_REGEX = re.compile(r'\s+')
 
 def remove_accents(text: str) -> str:
+    if text.isascii():
+        # NFD leaves ASCII unchanged and ASCII has no combining characters
+        return text
     return ''.join(
             c for c in unicodedata.normalize('NFD', text)
             if not unicodedata.combining(c)
         )
 
 def normalize_text(text: str) -> str:
+    """Lowercases, strips ASCII punctuation, collapses whitespace runs to one space and removes accents."""
     text = text.lower()
-    text = text.translate(str.maketrans('', '', string.punctuation))
-    text = re.sub(r'\s+', ' ', text)
+    text = text.translate(PUNCTUATION_TABLE)
+    text = WHITESPACE_REGEX.sub(' ', text)
     text = remove_accents(text)
     return text
 
+def normalize_texts(texts: Iterable[str]) -> list[str]:
+    return [normalize_text(text) for text in texts]
+
 def get_ngrams(text: str, n: int) -> list[str]:
     tokens = text.split()
     return [" ".join(tokens[i:i+n]) for i in range(len(tokens) - n + 1)]
@@ -41,17 +77,635 @@ def get_min_hash_signature(text: str, num_hashes: int, ngrams: int, use_char_ngr
         min_hash_signature.append(min(hashed_shingles))
     return min_hash_signature
 
+@lru_cache
+def universal_hash_parameters(num_hashes: int, seed: int = 42) -> tuple[np.ndarray, np.ndarray]:
+    """The (a, b) coefficients of each hash function, fixed by `seed` so signatures agree across processes."""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 1 << 32, size=num_hashes, dtype=np.uint64)
+    b = rng.integers(0, 1 << 32, size=num_hashes, dtype=np.uint64)
+    return a, b
+
+def get_shingles(text: str, ngrams: int, use_char_ngrams=True) -> list[str]:
+    if use_char_ngrams:
+        return get_char_ngrams(text, ngrams)
+    return get_ngrams(text, ngrams)
+
+def hash_shingles(shingles: list[str]) -> np.ndarray:
+    """64-bit MurmurHash3 of every shingle."""
+    return np.fromiter((mmh3.hash64(shingle, signed=False)[0] for shingle in shingles), dtype=np.uint64, count=len(shingles))
+
+def code_points(text: str) -> np.ndarray:
+    if text.isascii():
+        return np.frombuffer(text.encode('ascii'), dtype=np.uint8)
+    return np.frombuffer(text.encode('utf-32-le'), dtype='<u4')
+
+def window_hashes(values: np.ndarray, n: int) -> np.ndarray:
+    """64-bit hash of every length-`n` window of `values`, computed with `n` vectorized multiply-adds."""
+    num_windows = len(values) - n + 1
+    if num_windows <= 0:
+        return np.zeros(0, dtype=np.uint64)
+    values = values.astype(np.uint64)
+    hashes = values[:num_windows].copy()
+    for offset in range(1, n):
+        hashes *= SHINGLE_HASH_BASE
+        hashes += values[offset:offset + num_windows]
+    return fmix64(hashes)
+
+def rolling_shingle_hashes(text: str, ngrams: int, use_char_ngrams=True) -> np.ndarray:
+    """
+    64-bit hashes of the shingles `get_shingles` would return, without creating a string per shingle:
+    character n-grams are hashed over the text's code points, and word n-grams over an array of per-token
+    hashes (each token is hashed once instead of once per n-gram it belongs to).
+    """
+    if use_char_ngrams:
+        return window_hashes(code_points(text), ngrams)
+    tokens = text.split()
+    token_hashes = np.fromiter((mmh3.hash64(token, signed=False)[0] for token in tokens), dtype=np.uint64, count=len(tokens))
+    return window_hashes(token_hashes, ngrams)
+
+def get_shingle_set(text: str, ngrams: int, use_char_ngrams=True) -> np.ndarray:
+    """The document's distinct shingles as a sorted array of 64-bit hashes."""
+    return np.unique(rolling_shingle_hashes(text, ngrams, use_char_ngrams))
+
+def min_hash_signature_from_hashes(shingle_hashes: np.ndarray, num_hashes: int) -> np.ndarray:
+    """Column-wise minimum of every universal hash function applied to the low 32 bits of every shingle hash."""
+    if len(shingle_hashes) == 0:
+        return np.zeros(num_hashes, dtype=np.uint32)
+
+    a, b = universal_hash_parameters(num_hashes)
+    shingle_hashes = np.unique(shingle_hashes & MAX_HASH)
+    signature = np.full(num_hashes, MAX_HASH, dtype=np.uint64)
+    for start in range(0, len(shingle_hashes), SIGNATURE_BLOCK_SIZE):
+        block = shingle_hashes[start:start + SIGNATURE_BLOCK_SIZE, None]
+        permuted = (block * a + b) % MERSENNE_PRIME & MAX_HASH
+        np.minimum(signature, permuted.min(axis=0), out=signature)
+    return signature.astype(np.uint32)
+
+def get_min_hash_signature_vectorized(text: str, num_hashes: int, ngrams: int, use_char_ngrams=True) -> np.ndarray:
+    """
+    Like `get_min_hash_signature`, but hashes each shingle once with `rolling_shingle_hashes` and derives all
+    `num_hashes` permutations with NumPy broadcasting. Returns a compact uint32 array.
+    """
+    return min_hash_signature_from_hashes(rolling_shingle_hashes(text, ngrams, use_char_ngrams), num_hashes)
+
 def lsh_bands(signature, num_bands):
     rows_per_band = len(signature) // num_bands
     return [tuple(signature[i:i+rows_per_band]) for i in range(0, len(signature), rows_per_band)]
 
 def estimate_jaccard_similarity(sig1, sig2):
     """Estimate Jaccard similarity between two MinHash signatures"""
-    if not sig1 or not sig2:
+    if len(sig1) == 0 or len(sig2) == 0:
         return 0.0
+    if isinstance(sig1, np.ndarray):
+        return float(np.mean(sig1 == sig2))
     matches = sum(1 for a, b in zip(sig1, sig2) if a == b)
     return matches / len(sig1)
 
+def exact_jaccard_similarity(shingle_set1: np.ndarray, shingle_set2: np.ndarray) -> float:
+    """True Jaccard similarity of two sorted, duplicate-free shingle hash arrays."""
+    if len(shingle_set1) == 0 or len(shingle_set2) == 0:
+        return 0.0
+    intersection = len(np.intersect1d(shingle_set1, shingle_set2, assume_unique=True))
+    return intersection / (len(shingle_set1) + len(shingle_set2) - intersection)
+
+class ShingleSetCache:
+    """
+    LRU cache of per-document shingle sets (see `get_shingle_set`) holding at most about `max_bytes` of hashes.
+    Sets are `put` while the signatures are computed, so candidates are usually verified without touching the
+    text again; `load(doc_idx)` is only called for documents that have been evicted.
+    """
+
+    def __init__(self, load: Callable[[int], np.ndarray], max_bytes: int = 1 << 28):
+        self.load = load
+        self.max_bytes = max_bytes
+        self.num_bytes = 0
+        self.num_misses = 0
+        self._shingle_sets: OrderedDict[int, np.ndarray] = OrderedDict()
+
+    def put(self, doc_idx: int, shingle_set: np.ndarray):
+        if doc_idx in self._shingle_sets:
+            self.num_bytes -= self._shingle_sets.pop(doc_idx).nbytes
+        self._shingle_sets[doc_idx] = shingle_set
+        self.num_bytes += shingle_set.nbytes
+        while self.num_bytes > self.max_bytes and len(self._shingle_sets) > 1:
+            self.num_bytes -= self._shingle_sets.popitem(last=False)[1].nbytes
+
+    def __getitem__(self, doc_idx: int) -> np.ndarray:
+        if doc_idx in self._shingle_sets:
+            self._shingle_sets.move_to_end(doc_idx)
+            return self._shingle_sets[doc_idx]
+        self.num_misses += 1
+        shingle_set = np.asarray(self.load(doc_idx))
+        self.put(doc_idx, shingle_set)
+        return shingle_set
+
+    def jaccard(self, idx1: int, idx2: int) -> float:
+        return exact_jaccard_similarity(self[idx1], self[idx2])
+
+# Similarity of two documents by index, used to verify LSH candidates instead of the signature estimate
+Similarity = Callable[[int, int], float]
+
+def lsh_candidate_pairs(signatures: np.ndarray, num_bands: int) -> set[tuple[int, int]]:
+    """
+    Pairs of rows of the (num_documents, num_hashes) `signatures` matrix that agree on at least one band.
+    Bands are bucketed one at a time, so only a single band's bucket table is held in memory.
+    """
+    num_hashes = signatures.shape[1]
+    rows_per_band = num_hashes // num_bands
+    candidate_pairs = set()
+    for band_start in range(0, num_hashes, rows_per_band):
+        buckets = {}
+        for doc_idx, key in enumerate(band_keys(signatures[:, band_start:band_start + rows_per_band]).tolist()):
+            if key in buckets:
+                for other_idx in buckets[key]:
+                    candidate_pairs.add((other_idx, doc_idx))
+                buckets[key].append(doc_idx)
+            else:
+                buckets[key] = [doc_idx]
+    return candidate_pairs
+
+def signature_similarity(signatures: np.ndarray) -> Similarity:
+    return lambda idx1, idx2: estimate_jaccard_similarity(signatures[idx1], signatures[idx2])
+
+def find_duplicates(
+    signatures: np.ndarray,
+    candidate_pairs: set[tuple[int, int]],
+    jaccard_threshold: float,
+    similarity: Similarity | None = None,
+) -> set[int]:
+    """
+    Rows whose similarity to an earlier candidate row reaches the threshold; the earlier row is kept. The
+    similarity is estimated from the signatures unless a `similarity` (e.g. `ShingleSetCache.jaccard`) is given.
+    """
+    similarity = similarity or signature_similarity(signatures)
+    duplicates = set()
+    for idx1, idx2 in candidate_pairs:
+        if similarity(idx1, idx2) >= jaccard_threshold:
+            duplicates.add(idx2)
+    return duplicates
+
+class UnionFind:
+    """Disjoint sets over 0..n-1 with path halving. The root of every set is its smallest member."""
+
+    def __init__(self, n: int):
+        self.parent = np.arange(n, dtype=np.int64)
+
+    def find(self, x: int) -> int:
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return int(x)
+
+    def union(self, x: int, y: int):
+        root_x, root_y = self.find(x), self.find(y)
+        if root_x != root_y:
+            self.parent[max(root_x, root_y)] = min(root_x, root_y)
+
+    def roots(self) -> np.ndarray:
+        return np.array([self.find(x) for x in range(len(self.parent))], dtype=np.int64)
+
+def lsh_clusters(
+    signatures: np.ndarray,
+    num_bands: int,
+    jaccard_threshold: float,
+    verify: bool = True,
+    similarity: Similarity | None = None,
+) -> np.ndarray:
+    """
+    Clusters the rows of `signatures` with union-find as they are bucketed, returning each row's cluster root
+    (its smallest member, which is the copy that is kept).
+
+    Each bucket only remembers one representative per cluster it has seen, so a hot bucket of k near-identical
+    documents costs O(k) instead of the O(k^2) pairs `lsh_candidate_pairs` would produce. Without `verify`,
+    sharing a band is enough to join a cluster; with it, a row joins a representative's cluster only if their
+    estimated similarity reaches `jaccard_threshold`. Clusters are transitive, so a chain of near-duplicates
+    ends up in one cluster even when its ends are further apart than the threshold.
+    """
+    similarity = similarity or signature_similarity(signatures)
+    num_hashes = signatures.shape[1]
+    rows_per_band = num_hashes // num_bands
+    clusters = UnionFind(len(signatures))
+    for band_start in range(0, num_hashes, rows_per_band):
+        buckets = {}
+        for doc_idx, key in enumerate(band_keys(signatures[:, band_start:band_start + rows_per_band]).tolist()):
+            representatives = buckets.get(key)
+            if representatives is None:
+                buckets[key] = [doc_idx]
+            elif not verify:
+                clusters.union(representatives[0], doc_idx)
+            else:
+                for other_idx in representatives:
+                    if (
+                        clusters.find(other_idx) == clusters.find(doc_idx)
+                        or similarity(other_idx, doc_idx) >= jaccard_threshold
+                    ):
+                        clusters.union(other_idx, doc_idx)
+                        break
+                else:
+                    representatives.append(doc_idx)
+    return clusters.roots()
+
+def cluster_size_histogram(roots: np.ndarray) -> dict[int, int]:
+    """Maps each cluster size to the number of clusters of that size, singletons included."""
+    cluster_sizes = np.bincount(roots, minlength=len(roots))
+    return dict(sorted(Counter(cluster_sizes[cluster_sizes > 0].tolist()).items()))
+
+def write_cluster_size_histogram(path: str, roots: np.ndarray):
+    write_json_atomically(path, {str(size): count for size, count in cluster_size_histogram(roots).items()})
+
+def find_duplicate_rows(
+    signatures: np.ndarray,
+    num_bands: int,
+    jaccard_threshold: float,
+    clustering: Clustering = "pairs",
+    verify_clusters: bool = True,
+    histogram_path: str | None = None,
+    similarity: Similarity | None = None,
+) -> np.ndarray:
+    """Sorted indices of the rows of `signatures` to drop, using the given `clustering` mode."""
+    if clustering == "pairs":
+        if histogram_path is not None:
+            raise ValueError("A cluster size histogram requires clustering='union_find'")
+        candidate_pairs = lsh_candidate_pairs(signatures, num_bands)
+        return np.array(sorted(find_duplicates(signatures, candidate_pairs, jaccard_threshold, similarity)), dtype=np.int64)
+    if clustering == "union_find":
+        roots = lsh_clusters(signatures, num_bands, jaccard_threshold, verify_clusters, similarity)
+        if histogram_path is not None:
+            write_cluster_size_histogram(histogram_path, roots)
+        return np.flatnonzero(roots != np.arange(len(roots)))
+    raise ValueError(f"Unknown clustering: {clustering}")
+
+def bucket_order(keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    The bucket table of one band: the rows sorted by key (and by row within a bucket), and a mask of the
+    positions in that order where a new bucket starts.
+    """
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    starts_bucket = np.ones(len(order), dtype=bool)
+    starts_bucket[1:] = sorted_keys[1:] != sorted_keys[:-1]
+    return order, starts_bucket
+
+def bucket_head_edges(order: np.ndarray, starts_bucket: np.ndarray) -> np.ndarray:
+    """Links every row to the first (smallest) row of its bucket, which takes O(k) edges per bucket of k rows."""
+    bucket_heads = order[np.maximum.accumulate(np.where(starts_bucket, np.arange(len(order)), 0))]
+    return np.stack([bucket_heads[~starts_bucket], order[~starts_bucket]], axis=1)
+
+def bucket_pair_edges(
+    order: np.ndarray, starts_bucket: np.ndarray, keep: Callable[[np.ndarray], np.ndarray]
+) -> np.ndarray:
+    """All pairs of rows that share a bucket, like `lsh_candidate_pairs`, filtered by `keep` as they are made."""
+    # Rows of a bucket are sorted, so pairing every position with the ones `distance` places later in its
+    # bucket yields each pair once, smaller row first
+    bucket_ends = np.flatnonzero(np.append(starts_bucket[1:], True)) + 1
+    num_later = bucket_ends[np.cumsum(starts_bucket) - 1] - np.arange(len(order)) - 1
+    positions = np.flatnonzero(num_later > 0)
+    edges = [np.zeros((0, 2), dtype=np.int64)]
+    distance = 1
+    while len(positions) > 0:
+        candidate_edges = np.stack([order[positions], order[positions + distance]], axis=1)
+        edges.append(candidate_edges[keep(candidate_edges)])
+        positions = positions[num_later[positions] > distance]
+        distance += 1
+    return np.concatenate(edges)
+
+def bucket_representative_edges(
+    order: np.ndarray, starts_bucket: np.ndarray, keep: Callable[[np.ndarray], np.ndarray]
+) -> np.ndarray:
+    """
+    The representative scheme of `lsh_clusters` for one band: every row is linked to the first representative
+    of its bucket that `keep` accepts, and becomes a representative itself if there is none. All buckets are
+    processed together, one representative per bucket and round, so a bucket of k near-identical rows costs
+    O(k) checks and edges instead of O(k^2).
+    """
+    bucket_ids = np.cumsum(starts_bucket) - 1
+    shared = np.bincount(bucket_ids)[bucket_ids] > 1
+    rows, buckets = order[shared], bucket_ids[shared]
+    edges = [np.zeros((0, 2), dtype=np.int64)]
+    while len(rows) > 0:
+        # The smallest row left in each bucket is its next representative
+        is_head = np.ones(len(rows), dtype=bool)
+        is_head[1:] = buckets[1:] != buckets[:-1]
+        heads = rows[np.maximum.accumulate(np.where(is_head, np.arange(len(rows)), 0))]
+        candidate_edges = np.stack([heads[~is_head], rows[~is_head]], axis=1)
+        joined = np.zeros(len(rows), dtype=bool)
+        joined[~is_head] = keep(candidate_edges)
+        edges.append(np.stack([heads[joined], rows[joined]], axis=1))
+        remaining = ~is_head & ~joined
+        rows, buckets = rows[remaining], buckets[remaining]
+    return np.concatenate(edges)
+
+def shingle_offsets_path(shingle_path: str) -> str:
+    return f"{shingle_path}.offsets.npy"
+
+def shingle_file_cache(shingle_path: str, max_bytes: int = 1 << 28) -> ShingleSetCache:
+    """A `ShingleSetCache` over the shingle file written by `minhash_deduplication_streaming` and its offsets."""
+    shingle_offsets = np.load(shingle_offsets_path(shingle_path), mmap_mode='r')
+
+    def load_shingle_set(doc_idx: int) -> np.ndarray:
+        start, end = int(shingle_offsets[doc_idx]), int(shingle_offsets[doc_idx + 1])
+        return np.fromfile(shingle_path, dtype=np.uint64, count=end - start, offset=start * 8)
+
+    return ShingleSetCache(load_shingle_set, max_bytes)
+
+def band_edges(
+    signature_path: str,
+    num_hashes: int,
+    band_start: int,
+    rows_per_band: int,
+    jaccard_threshold: float,
+    clustering: Clustering = "pairs",
+    verify_clusters: bool = True,
+    shingle_path: str | None = None,
+    shingle_cache_bytes: int = 1 << 28,
+) -> np.ndarray:
+    """
+    The verified edges of one band of a memory-mapped signature file, as an (num_edges, 2) array of
+    (smaller row, larger row). The bucket table is a sort of the band's 64-bit keys, and candidates are
+    checked in the task (with exact Jaccard similarity over the shingle file at `shingle_path` if given), so
+    only the edges that reach `jaccard_threshold` are returned:
+
+    - "pairs": every verified pair of rows that share a bucket, like `lsh_candidate_pairs`.
+    - "union_find" with `verify_clusters`: every row linked to the first representative of its bucket it is
+      similar to, as in `lsh_clusters`.
+    - "union_find" without `verify_clusters`: every row linked to the first row of its bucket, unchecked.
+    """
+    records = np.memmap(signature_path, dtype=signature_record_dtype(num_hashes), mode='r')
+    signatures = records["signature"]
+    order, starts_bucket = bucket_order(band_keys(signatures[:, band_start:band_start + rows_per_band]))
+    similarity = shingle_file_cache(shingle_path, shingle_cache_bytes).jaccard if shingle_path is not None else None
+
+    def keep(edges: np.ndarray) -> np.ndarray:
+        return verify_edges(signatures, edges, jaccard_threshold, similarity)
+
+    if clustering == "pairs":
+        return bucket_pair_edges(order, starts_bucket, keep)
+    if clustering == "union_find":
+        if verify_clusters:
+            return bucket_representative_edges(order, starts_bucket, keep)
+        return bucket_head_edges(order, starts_bucket)
+    raise ValueError(f"Unknown clustering: {clustering}")
+
+def parallel_lsh_edges(
+    signature_path: str,
+    num_hashes: int,
+    num_bands: int,
+    jaccard_threshold: float,
+    clustering: Clustering = "pairs",
+    verify_clusters: bool = True,
+    backend: Backend = "local",
+    num_workers: int | None = None,
+    shingle_path: str | None = None,
+    shingle_cache_bytes: int = 1 << 28,
+) -> np.ndarray:
+    """Runs `band_edges` for every band as a separate task and merges the per-band edges."""
+    rows_per_band = num_hashes // num_bands
+    per_band_edges = run_tasks(
+        band_edges,
+        [
+            (
+                signature_path,
+                num_hashes,
+                band_start,
+                rows_per_band,
+                jaccard_threshold,
+                clustering,
+                verify_clusters,
+                shingle_path,
+                shingle_cache_bytes,
+            )
+            for band_start in range(0, num_hashes, rows_per_band)
+        ],
+        backend,
+        num_workers,
+        desc="Banding",
+    )
+    return np.unique(np.concatenate(per_band_edges), axis=0)
+
+def verify_edges(
+    signatures: np.ndarray,
+    edges: np.ndarray,
+    jaccard_threshold: float,
+    similarity: Similarity | None = None,
+) -> np.ndarray:
+    """Boolean mask of the edges whose endpoints' similarity (estimated from the signatures by default) reaches the threshold."""
+    if similarity is not None:
+        return np.array([similarity(x, y) >= jaccard_threshold for x, y in edges.tolist()], dtype=bool)
+    keep = np.empty(len(edges), dtype=bool)
+    for start in range(0, len(edges), EDGE_BLOCK_SIZE):
+        block = edges[start:start + EDGE_BLOCK_SIZE]
+        keep[start:start + EDGE_BLOCK_SIZE] = (signatures[block[:, 0]] == signatures[block[:, 1]]).mean(axis=1) >= jaccard_threshold
+    return keep
+
+def connected_component_roots(num_rows: int, edges: np.ndarray) -> np.ndarray:
+    """
+    The smallest row of each row's connected component in the graph of `edges`, like `UnionFind.roots`, but
+    computed with vectorized hooking and pointer jumping instead of one `union` per edge.
+    """
+    roots = np.arange(num_rows, dtype=np.int64)
+    if len(edges) == 0:
+        return roots
+    x, y = edges[:, 0].astype(np.int64), edges[:, 1].astype(np.int64)
+    while True:
+        # Hook the larger root of every edge whose ends are in different trees under the smaller one
+        root_x, root_y = roots[x], roots[y]
+        crossing = root_x != root_y
+        if not crossing.any():
+            return roots
+        np.minimum.at(roots, np.maximum(root_x, root_y)[crossing], np.minimum(root_x, root_y)[crossing])
+        # Pointer jumping flattens every tree so each row points straight at its root
+        while True:
+            parents = roots[roots]
+            if np.array_equal(parents, roots):
+                break
+            roots = parents
+
+def duplicate_rows_from_edges(
+    num_rows: int,
+    edges: np.ndarray,
+    clustering: Clustering = "pairs",
+    histogram_path: str | None = None,
+) -> np.ndarray:
+    """
+    `find_duplicate_rows` for the verified edges found by `parallel_lsh_edges`. The "pairs" mode drops the
+    same rows as `find_duplicate_rows`, and so does "union_find" without `verify_clusters`. Verified
+    "union_find" clusters the connected components of the representative edges of every band; a row that
+    `lsh_clusters` would skip because an earlier band already joined it to a representative's cluster can
+    still become a representative within its own band, so the clusters may differ slightly.
+    """
+    if clustering == "pairs":
+        if histogram_path is not None:
+            raise ValueError("A cluster size histogram requires clustering='union_find'")
+        return np.unique(edges[:, 1])
+    if clustering == "union_find":
+        roots = connected_component_roots(num_rows, edges)
+        if histogram_path is not None:
+            write_cluster_size_histogram(histogram_path, roots)
+        return np.flatnonzero(roots != np.arange(len(roots)))
+    raise ValueError(f"Unknown clustering: {clustering}")
+
+def is_jsonl(path: os.PathLike) -> bool:
+    """Whether `path` is a JSONL document shard (e.g. `.jsonl.gz` from process_wet_files) rather than one document."""
+    return ".jsonl" in os.path.basename(path)
+
+def parse_text(line: str) -> str | None:
+    """The non-empty "text" field of a JSONL line, or None for malformed or empty records."""
+    try:
+        return json.loads(line).get("text") or None
+    except json.JSONDecodeError:
+        return None
+
+def iter_documents(input_files: list[os.PathLike]) -> Iterator[str | None]:
+    """Yields every document: the whole file for plain inputs, and `parse_text` of every line for JSONL shards."""
+    # fsspec is imported where it is used, which keeps importing this module cheap
+    import fsspec
+
+    for input_file in input_files:
+        if not is_jsonl(input_file):
+            with open(input_file, 'r') as f:
+                yield f.read()
+            continue
+        with fsspec.open(input_file, 'rt', compression="infer") as f:
+            for line in f:
+                yield parse_text(line)
+
+def signature_record_dtype(num_hashes: int) -> np.dtype:
+    # doc_id is the position of the document among all documents with text, in input order
+    return np.dtype([("doc_id", np.uint64), ("signature", np.uint32, (num_hashes,))])
+
+def minhash_deduplication_streaming(
+    input_files: list[os.PathLike],
+    num_hashes: int,
+    num_bands: int,
+    ngrams: int,
+    jaccard_threshold: float,
+    output_directory: os.PathLike,
+    use_char_ngrams=True,
+    work_directory: str | None = None,
+    clustering: Clustering = "pairs",
+    verify_clusters: bool = True,
+    histogram_path: str | None = None,
+    backend: Backend | None = None,
+    num_workers: int | None = None,
+    exact_verification: bool = False,
+    shingle_cache_bytes: int = 1 << 28,
+    index_directory: str | None = None,
+):
+    """
+    Two-phase MinHash deduplication whose memory use does not grow with the size of the documents.
+
+    Phase one streams the documents, computes their (vectorized) signatures and appends only
+    (doc_id, signature) records to a file in `work_directory`, which is memory-mapped for LSH. Phase two
+    re-reads the inputs in the same order and copies the survivors: plain files are copied as-is, and JSONL
+    shards are rewritten line by line (dropping records without text) with the same name and compression.
+
+    See `find_duplicate_rows` for `clustering`, `verify_clusters` and `histogram_path`. With a `backend`,
+    every band is bucketed and its candidates verified by a separate task (so `work_directory` must be
+    visible to all of them), and only the verified edges are merged afterwards, as described in
+    `duplicate_rows_from_edges`.
+
+    With `exact_verification`, candidates are verified with their true Jaccard similarity instead of the
+    signature estimate. Phase one then also writes every document's shingle set (8 bytes per distinct
+    shingle) next to the signatures, and a `ShingleSetCache` of `shingle_cache_bytes` serves the candidates.
+    With one shingle per character, that file takes roughly 8 times the size of the input text in
+    `work_directory`.
+
+    With an `index_directory`, documents that survive are also checked against the documents kept by earlier
+    runs in that `DedupIndex`, and the signatures of the final survivors are added to it.
+    """
+    import fsspec
+
+    index = DedupIndex.open(index_directory, num_hashes, num_bands) if index_directory is not None else None
+    os.makedirs(output_directory, exist_ok=True)
+    if work_directory is not None:
+        os.makedirs(work_directory, exist_ok=True)
+    record_dtype = signature_record_dtype(num_hashes)
+    signature_directory = tempfile.mkdtemp(prefix="minhash_signatures_", dir=work_directory)
+    signature_path = os.path.join(signature_directory, "signatures.bin")
+    shingle_path = os.path.join(signature_directory, "shingles.bin")
+    # shingle_offsets[i]:shingle_offsets[i + 1] is document i's slice of the shingle file
+    shingle_offsets = [0]
+
+    def load_shingle_set(doc_idx: int) -> np.ndarray:
+        start, end = shingle_offsets[doc_idx], shingle_offsets[doc_idx + 1]
+        return np.fromfile(shingle_path, dtype=np.uint64, count=end - start, offset=start * 8)
+
+    shingle_sets = ShingleSetCache(load_shingle_set, shingle_cache_bytes) if exact_verification else None
+
+    try:
+        # Phase 1: signatures (and shingle sets) only
+        num_documents = 0
+        shingle_file = open(shingle_path, 'wb') if shingle_sets is not None else nullcontext()
+        with open(signature_path, 'wb') as f_signatures, shingle_file as f_shingles:
+            for text in iter_documents(input_files):
+                if text is None:
+                    continue
+                text = normalize_text(text)
+                if shingle_sets is None:
+                    signature = get_min_hash_signature_vectorized(text, num_hashes, ngrams, use_char_ngrams)
+                else:
+                    shingle_set = get_shingle_set(text, ngrams, use_char_ngrams)
+                    signature = min_hash_signature_from_hashes(shingle_set, num_hashes)
+                    shingle_set.tofile(f_shingles)
+                    shingle_offsets.append(shingle_offsets[-1] + len(shingle_set))
+                    shingle_sets.put(num_documents, shingle_set)
+                np.array([(num_documents, signature)], dtype=record_dtype).tofile(f_signatures)
+                num_documents += 1
+
+        is_duplicate = np.zeros(num_documents, dtype=bool)
+        if num_documents > 0:
+            records = np.memmap(signature_path, dtype=record_dtype, mode='r')
+            signatures = records["signature"]
+            if backend is None:
+                similarity = shingle_sets.jaccard if shingle_sets is not None else None
+                duplicates = find_duplicate_rows(
+                    signatures, num_bands, jaccard_threshold, clustering, verify_clusters, histogram_path, similarity
+                )
+            else:
+                if shingle_sets is not None:
+                    np.save(shingle_offsets_path(shingle_path), np.array(shingle_offsets, dtype=np.int64))
+                edges = parallel_lsh_edges(
+                    signature_path,
+                    num_hashes,
+                    num_bands,
+                    jaccard_threshold,
+                    clustering,
+                    verify_clusters,
+                    backend,
+                    num_workers,
+                    shingle_path if shingle_sets is not None else None,
+                    shingle_cache_bytes,
+                )
+                duplicates = duplicate_rows_from_edges(num_documents, edges, clustering, histogram_path)
+            is_duplicate[records["doc_id"][duplicates]] = True
+            if index is not None:
+                survivors = np.flatnonzero(~is_duplicate)
+                for start in range(0, len(survivors), EDGE_BLOCK_SIZE):
+                    block = survivors[start:start + EDGE_BLOCK_SIZE]
+                    is_duplicate[block[index.query_documents(signatures[block], jaccard_threshold)]] = True
+                index.add(signatures=signatures[~is_duplicate])
+            del records, signatures
+    finally:
+        shutil.rmtree(signature_directory, ignore_errors=True)
+
+    # Phase 2: copy the survivors from disk
+    doc_id = 0
+    for input_file in input_files:
+        output_file_path = os.path.join(output_directory, os.path.basename(input_file))
+        if not is_jsonl(input_file):
+            if not is_duplicate[doc_id]:
+                shutil.copyfile(input_file, output_file_path)
+            doc_id += 1
+            continue
+        with fsspec.open(input_file, 'rt', compression="infer") as f_in, StreamingJsonlWriter(output_file_path) as writer:
+            for line in f_in:
+                if parse_text(line) is None:
+                    continue
+                if not is_duplicate[doc_id]:
+                    writer.write_line(line)
+                doc_id += 1
+
 def minhash_deduplication(
     input_files: list[os.PathLike],
     num_hashes: int,
@@ -60,43 +714,75 @@ def minhash_deduplication(
     jaccard_threshold: float,
     output_directory: os.PathLike,
     use_char_ngrams=True,  # Default to character-level n-grams for fuzzy duplicates
+    vectorized=False,  # Compute signatures with get_min_hash_signature_vectorized
+    clustering: Clustering = "pairs",
+    verify_clusters=True,  # Only join a union-find cluster when the estimated similarity reaches the threshold
+    histogram_path: str | None = None,  # JSON cluster size histogram, for clustering="union_find"
+    exact_verification=False,  # Verify candidates with their true Jaccard similarity over cached shingle sets
+    shingle_cache_bytes: int = 1 << 28,
 ):
     os.makedirs(output_directory, exist_ok=True)
+    signature_fn = get_min_hash_signature_vectorized if vectorized else get_min_hash_signature
 
     # Process all input files and compute signatures
     signatures = []
     original_texts = []
+    shingle_sets = None
+    if exact_verification:
+        shingle_sets = ShingleSetCache(
+            lambda file_idx: get_shingle_set(normalize_text(original_texts[file_idx]), ngrams, use_char_ngrams),
+            shingle_cache_bytes,
+        )
         
     for file_idx, input_file in enumerate(input_files):
         with open(input_file, 'r') as f:
             original_text = f.read()
             original_texts.append(original_text)
             text = normalize_text(original_text)
-            min_hash_signature = get_min_hash_signature(text, num_hashes, ngrams, use_char_ngrams)
+            min_hash_signature = signature_fn(text, num_hashes, ngrams, use_char_ngrams)
             signatures.append((file_idx, min_hash_signature))
+            if shingle_sets is not None:
+                shingle_sets.put(file_idx, get_shingle_set(text, ngrams, use_char_ngrams))
     
-    # Find candidate pairs using LSH
-    buckets = {}
-    candidate_pairs = set()
-    
-    for file_idx, signature in enumerate(signatures):
-        for band_idx, band in enumerate(lsh_bands(signature[1], num_bands)):
-            key = (band_idx, band)
-            if key in buckets:
-                # Add candidate pairs
-                for other_idx in buckets[key]:
-                    candidate_pairs.add((min(file_idx, other_idx), max(file_idx, other_idx)))
-                buckets[key].append(file_idx)
+    if clustering == "pairs":
+        if histogram_path is not None:
+            raise ValueError("A cluster size histogram requires clustering='union_find'")
+        # Find candidate pairs using LSH
+        buckets = {}
+        candidate_pairs = set()
+
+        for file_idx, signature in enumerate(signatures):
+            for band_idx, band in enumerate(lsh_bands(signature[1], num_bands)):
+                key = (band_idx, band)
+                if key in buckets:
+                    # Add candidate pairs
+                    for other_idx in buckets[key]:
+                        candidate_pairs.add((min(file_idx, other_idx), max(file_idx, other_idx)))
+                    buckets[key].append(file_idx)
+                else:
+                    buckets[key] = [file_idx]
+
+        # Determine duplicates by calculating actual Jaccard similarity
+        duplicates = set()
+        for idx1, idx2 in candidate_pairs:
+            if shingle_sets is not None:
+                similarity = shingle_sets.jaccard(idx1, idx2)
             else:
-                buckets[key] = [file_idx]
-    
-    # Determine duplicates by calculating actual Jaccard similarity
-    duplicates = set()
-    for idx1, idx2 in candidate_pairs:
-        similarity = estimate_jaccard_similarity(signatures[idx1][1], signatures[idx2][1])
-        if similarity >= jaccard_threshold:
-            duplicates.add(idx2)  # Keep idx1 (the smaller index) as the original
-            
+                similarity = estimate_jaccard_similarity(signatures[idx1][1], signatures[idx2][1])
+            if similarity >= jaccard_threshold:
+                duplicates.add(idx2)  # Keep idx1 (the smaller index) as the original
+    else:
+        signature_matrix = np.array([signature for _, signature in signatures]).reshape(len(signatures), num_hashes)
+        duplicates = set(find_duplicate_rows(
+            signature_matrix,
+            num_bands,
+            jaccard_threshold,
+            clustering,
+            verify_clusters,
+            histogram_path,
+            shingle_sets.jaccard if shingle_sets is not None else None,
+        ).tolist())
+
     # Write non-duplicate documents
     for file_idx, input_file in enumerate(input_files):
         if file_idx not in duplicates:
@@ -1,16 +1,11 @@
-import fasttext
-from functools import lru_cache
+import numpy as np
+from cs336_data.fasttext_models import load_model, predict_batch
 
-hatespeech_model_path = "/data/classifiers/dolma_fasttext_hatespeech_jigsaw_model.bin"
-nsfw_model_path = "/data/classifiers/dolma_fasttext_nsfw_jigsaw_model.bin"
-
-@lru_cache
 def hatespeech_model():
-    return fasttext.load_model(hatespeech_model_path)
+    return load_model("hate")
 
-@lru_cache
 def nsfw_model():
-    return fasttext.load_model(nsfw_model_path)
+    return load_model("nsfw")
 
 harm_type_to_model_path = {
     "nsfw": nsfw_model,
@@ -22,4 +17,12 @@ def classify(text: str, harm_type: str):
     prediction = model.predict(text.replace("\n", " "))
 
     cleaned_prediction = (prediction[0][0].replace("__label__", ""), prediction[1][0])
-    return cleaned_prediction
\ No newline at end of file
+    return cleaned_prediction
+
+def classify_batch(texts: list[str], harm_type: str) -> tuple[np.ndarray, np.ndarray]:
+    """Classify many documents for `harm_type` with a single `predict` call.
+
+    Returns an array of labels and an array of their probabilities, aligned with `texts`.
+    """
+    model = harm_type_to_model_path[harm_type]()
+    return predict_batch(model, [text.replace("\n", " ") for text in texts])
@@ -1,36 +1,59 @@
 import os
 import json
+import multiprocessing
 import submitit
 from tqdm import tqdm
 import pathlib
 import glob
-import fsspec
 from fastwarc.warc import ArchiveIterator, WarcRecordType
-from cs336_data.gopher import check_gopher_filters
-from cs336_data.language_identification import identify_language
-from cs336_data.nsfw_detection import classify
-from cs336_data.quality_classify import classify_quality
+from cs336_data.fasttext_models import MODEL_PATHS, load_model, model_path, set_model_path
+from cs336_data.filter_pipeline import Document, FilterPipeline, default_stages
+from cs336_data.jsonl_io import StreamingJsonlWriter, merge_stats, write_json_atomically, write_stats_and_success
 from fastwarc.stream_io import *
 import random
 import draccus
+from collections import Counter
 from dataclasses import dataclass
+from typing import Iterator, Literal
 
 
 @dataclass
 class ProcessWetFilesConfig:
     output_path: str = "/data/c-cychou/documents"
     max_files: int | None = None
+    wet_directory: str = "/data/CC"
+    # Number of records per classifier `predict` call
+    batch_size: int = 256
+    # "slurm" submits one submitit job per file; "local" filters on a process pool on this machine
+    backend: Literal["slurm", "local"] = "slurm"
+    # Local backend only: defaults to one worker per CPU
+    num_workers: int | None = None
+    # Local backend only: write each file's kept documents in input order
+    ordered: bool = True
+    # Flush the output every this many kept documents
+    flush_interval: int = 1000
+    # Slurm backend only: save a resumable checkpoint every this many input records
+    checkpoint_interval: int = 10_000
 
 def replace_file_extensions(filename: str) -> str:
     basename_without_extensions = filename.split(".warc.wet.gz")[0]
     return basename_without_extensions, f"{basename_without_extensions}.jsonl.gz"
 
-def process_single_wet_file(input_path: str, output_path: str):
+def process_single_wet_file(
+    input_path: str,
+    output_path: str,
+    batch_size: int = 256,
+    flush_interval: int = 1000,
+    checkpoint_interval: int = 10_000,
+):
     """
     Processes a single WET file:
     - Reads WET records with extracted text
-    - Applies language, NSFW, hate, and Gopher filters
-    - Writes filtered documents to output_path
+    - Buffers records into batches of `batch_size` so each classifier runs one `predict` call per batch
+    - Applies the language, Gopher, hate, NSFW, and quality filters through a `FilterPipeline`
+    - Streams filtered documents to a temporary file that is renamed to output_path once the whole file is done
+    - Every `checkpoint_interval` records, saves the number of records processed, the size of the output so far
+      and the partial stats, so a task that is killed resumes from its last checkpoint instead of starting over
     """
 
     basename_without_extensions, output_path = replace_file_extensions(output_path)
@@ -39,79 +62,185 @@ def process_single_wet_file(input_path: str, output_path: str):
         print(f"Skipping {input_path} because it has already been processed at {basename_without_extensions}.SUCCESS")
         return output_path
 
-    filtered_lines = []
+    checkpoint_path = f"{basename_without_extensions}.checkpoint"
+    checkpoint = load_checkpoint(checkpoint_path, input_path, output_path)
+    if checkpoint is not None:
+        print(f"Resuming {input_path} after {checkpoint['num_records']} records from {checkpoint_path}")
+        num_records_done = checkpoint["num_records"]
+        resume_from_bytes = checkpoint["output_bytes"]
+        resumed_stats = checkpoint["stats"]
+    else:
+        num_records_done = 0
+        resume_from_bytes = None
+        resumed_stats = {}
+
     file_iterator = ArchiveIterator(GZipStream(FileStream(input_path, 'rb')), record_types=WarcRecordType.conversion)
-    
-    english_filtered_count = 0
-    gopher_filtered_count = 0
-    toxic_filtered_count = 0
-    nsfw_filtered_count = 0
-    quality_filtered_count = 0
-    number_kept = 0
-    number_total = 0
-
-    for record in file_iterator:
-        number_total += 1
-        record_body = record.reader.read()
-        # WET files already contain extracted text
-        text = record_body.decode('utf-8', errors='replace')
-        
-        # Apply filters
-        language, _ = identify_language(text)
-        if language != "en":
-            # print("Skipping non-English document")
-            english_filtered_count += 1
-            continue
-        gopher_flag_to_keep = check_gopher_filters(text)
-        if not gopher_flag_to_keep:
-            # print("Skipping Gopher document")
-            gopher_filtered_count += 1
-            continue
-        toxic_flag, _ = classify(text, "hate")
-        nsfw_flag, _ = classify(text, "nsfw")
-        if toxic_flag == "toxic" or nsfw_flag == "nsfw":
-            # print("Skipping toxic or NSFW document")
-            if toxic_flag == "toxic":
-                toxic_filtered_count += 1
-            if nsfw_flag == "nsfw":
-                nsfw_filtered_count += 1
-            continue
-        quality_flag, quality_score = classify_quality(text)
-        # print(quality_flag, quality_score)
-        if quality_flag == "lq":
-            print("Skipping low quality document")
-            quality_filtered_count += 1
-            continue
 
-        filtered_lines.append(text)
-        number_kept += 1
+    pipeline = FilterPipeline(default_stages())
+
+    with StreamingJsonlWriter(output_path, flush_interval, resume_from_bytes, remove_on_error=False) as writer:
+        batch = []
+        num_records = 0
+        num_records_at_checkpoint = num_records_done
+        for record in file_iterator:
+            num_records += 1
+            if num_records <= num_records_done:
+                # Already filtered before the checkpoint; the body is skipped without being read
+                continue
+
+            record_body = record.reader.read()
+            # WET files already contain extracted text
+            batch.append(record_body.decode('utf-8', errors='replace'))
 
-    with fsspec.open(output_path, "w", compression="infer") as f_out:
-        for line in filtered_lines:
-            f_out.write(json.dumps({"text": line}) + "\n")
+            if len(batch) >= batch_size:
+                write_kept_documents(writer, pipeline.filter_batch(batch))
+                batch = []
 
-    resp = {
-        "english_filtered_count": english_filtered_count,
-        "gopher_filtered_count": gopher_filtered_count,
-        "toxic_filtered_count": toxic_filtered_count,
-        "nsfw_filtered_count": nsfw_filtered_count,
-        "quality_filtered_count": quality_filtered_count,
-        "number_kept": number_kept,
-        "number_total": number_total,
-    }
-    with open(f"{basename_without_extensions}.stats", "w") as f_stats:
-        f_stats.write(json.dumps(resp))
+                if num_records - num_records_at_checkpoint >= checkpoint_interval:
+                    write_json_atomically(checkpoint_path, {
+                        "input_path": input_path,
+                        "num_records": num_records,
+                        "output_bytes": writer.checkpoint(),
+                        "stats": merge_stats(resumed_stats, pipeline.stats()),
+                    })
+                    num_records_at_checkpoint = num_records
 
-    with fsspec.open(f"{basename_without_extensions}.SUCCESS", "w") as f_success:
-        f_success.write(f"Successfully processed {input_path}")
+        if batch:
+            write_kept_documents(writer, pipeline.filter_batch(batch))
+
+    write_stats_and_success(basename_without_extensions, input_path, merge_stats(resumed_stats, pipeline.stats()))
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
 
     return output_path
 
+def load_checkpoint(checkpoint_path: str, input_path: str, output_path: str) -> dict | None:
+    """Returns the checkpoint left by an interrupted run over `input_path`, if its partial output is still there."""
+    if not os.path.exists(checkpoint_path) or not os.path.exists(f"{output_path}.tmp"):
+        return None
+    with open(checkpoint_path) as f_checkpoint:
+        checkpoint = json.load(f_checkpoint)
+    if checkpoint["input_path"] != input_path:
+        return None
+    return checkpoint
+
+def write_kept_documents(writer: StreamingJsonlWriter, documents: list[Document]):
+    for document in documents:
+        if document.rejected_by is None:
+            writer.write({"text": document.text})
+
+_worker_pipeline: FilterPipeline | None = None
+
+def init_worker(model_paths: dict[str, str]):
+    """Pool initializer: loads every classifier once per worker, before any records arrive."""
+    global _worker_pipeline
+    for name, path in model_paths.items():
+        set_model_path(name, path)
+        load_model(name)
+    _worker_pipeline = FilterPipeline(default_stages())
+
+def filter_chunk(chunk: tuple[int, int, list[str], bool]) -> tuple[int, int, bool, list[str], dict[str, int]]:
+    file_idx, chunk_idx, texts, is_last_chunk = chunk
+    documents = _worker_pipeline.filter_batch(texts)
+    kept_texts = [document.text for document in documents if document.rejected_by is None]
+    return file_idx, chunk_idx, is_last_chunk, kept_texts, _worker_pipeline.batch_stats(documents)
+
+def iter_wet_chunks(wet_filepaths: list[str], chunk_size: int) -> Iterator[tuple[int, int, list[str], bool]]:
+    """
+    Streams the records of each WET file as (file index, chunk index, texts, is last chunk) tuples.
+    Every file yields at least one chunk, so an empty file is still marked as done.
+    """
+    for file_idx, wet_filepath in enumerate(wet_filepaths):
+        file_iterator = ArchiveIterator(GZipStream(FileStream(wet_filepath, 'rb')), record_types=WarcRecordType.conversion)
+        chunk_idx = 0
+        pending_chunk = None
+        chunk = []
+        for record in file_iterator:
+            chunk.append(record.reader.read().decode('utf-8', errors='replace'))
+            if len(chunk) >= chunk_size:
+                # Hold one chunk back so the last chunk of the file can be flagged
+                if pending_chunk is not None:
+                    yield file_idx, chunk_idx, pending_chunk, False
+                    chunk_idx += 1
+                pending_chunk, chunk = chunk, []
+
+        if chunk:
+            if pending_chunk is not None:
+                yield file_idx, chunk_idx, pending_chunk, False
+                chunk_idx += 1
+            pending_chunk = chunk
+        yield file_idx, chunk_idx, pending_chunk or [], True
+
+def process_wet_files_locally(
+    wet_filepaths: list[str],
+    output_directory: str,
+    batch_size: int = 256,
+    num_workers: int | None = None,
+    ordered: bool = True,
+    flush_interval: int = 1000,
+):
+    """
+    Filters WET files on a local forkserver process pool. Records are streamed to the workers in chunks
+    of `batch_size`, so even a single large file keeps every core busy. Outputs, `.stats` and `.SUCCESS`
+    files match those written by `process_single_wet_file`.
+    """
+    input_paths = []
+    output_paths = []
+    for wet_filepath in wet_filepaths:
+        basename_without_extensions, output_path = replace_file_extensions(
+            os.path.join(output_directory, pathlib.Path(wet_filepath).name)
+        )
+        if os.path.exists(f"{basename_without_extensions}.SUCCESS"):
+            print(f"Skipping {wet_filepath} because it has already been processed at {basename_without_extensions}.SUCCESS")
+            continue
+        input_paths.append(wet_filepath)
+        output_paths.append((basename_without_extensions, output_path))
+
+    model_paths = {name: model_path(name) for name in MODEL_PATHS}
+    writers = {}
+    stats = {}
+    num_chunks_done = Counter()
+    num_chunks_expected = {}
+
+    context = multiprocessing.get_context("forkserver")
+    try:
+        with context.Pool(num_workers, initializer=init_worker, initargs=(model_paths,)) as pool:
+            imap = pool.imap if ordered else pool.imap_unordered
+            for file_idx, chunk_idx, is_last_chunk, kept_texts, chunk_stats in imap(
+                filter_chunk, iter_wet_chunks(input_paths, batch_size)
+            ):
+                basename_without_extensions, output_path = output_paths[file_idx]
+                if file_idx not in writers:
+                    writers[file_idx] = StreamingJsonlWriter(output_path, flush_interval)
+                    stats[file_idx] = Counter()
+
+                for text in kept_texts:
+                    writers[file_idx].write({"text": text})
+                stats[file_idx].update(chunk_stats)
+
+                num_chunks_done[file_idx] += 1
+                if is_last_chunk:
+                    num_chunks_expected[file_idx] = chunk_idx + 1
+                if num_chunks_done[file_idx] == num_chunks_expected.get(file_idx):
+                    writers.pop(file_idx).commit()
+                    write_stats_and_success(basename_without_extensions, input_paths[file_idx], dict(stats.pop(file_idx)))
+                    print(f"Output file written: {output_path}")
+    finally:
+        # Files whose chunks did not all come back are left unfinished, without a .SUCCESS marker
+        for writer in writers.values():
+            writer.abort()
+
 def get_files(wet_directory: str):
     filenames = glob.glob(os.path.join(wet_directory, "*.warc.wet.gz"))
     return [filename for filename in filenames if "example" not in filename]
     
-def submit_job(wet_filepaths: list[str], output_directory: str):
+def submit_job(
+    wet_filepaths: list[str],
+    output_directory: str,
+    batch_size: int = 256,
+    flush_interval: int = 1000,
+    checkpoint_interval: int = 10_000,
+):
     # Set up the submitit executor
     executor = submitit.AutoExecutor(folder="slurm_outputs")
     max_simultaneous_jobs = 12
@@ -135,7 +264,10 @@ def submit_job(wet_filepaths: list[str], output_directory: str):
             future = executor.submit(
                 process_single_wet_file,
                 wet_filepath,
-                os.path.join(output_directory, wet_filename)
+                os.path.join(output_directory, wet_filename),
+                batch_size,
+                flush_interval,
+                checkpoint_interval,
             )
             futures.append(future)
 
@@ -147,8 +279,30 @@ def submit_job(wet_filepaths: list[str], output_directory: str):
         output_file = future.result()
         print(f"Output file written: {output_file}")
 
+def run_job(wet_filepaths: list[str], output_directory: str, config: ProcessWetFilesConfig):
+    if config.backend == "slurm":
+        submit_job(wet_filepaths, output_directory, config.batch_size, config.flush_interval, config.checkpoint_interval)
+    elif config.backend == "local":
+        process_wet_files_locally(
+            wet_filepaths, output_directory, config.batch_size, config.num_workers, config.ordered, config.flush_interval
+        )
+    else:
+        raise ValueError(f"Unknown backend: {config.backend}")
+
 @draccus.wrap()
 def main(config: ProcessWetFilesConfig):
+    if config.backend == "local":
+        wet_filepaths = get_files(config.wet_directory)
+    else:
+        wet_filepaths = list_files_on_slurm(config.wet_directory)
+
+    if config.max_files is not None:
+        wet_filepaths = random.sample(wet_filepaths, config.max_files)
+
+    print(f"Job completed with {len(wet_filepaths)} files")
+    run_job(wet_filepaths, config.output_path, config)
+
+def list_files_on_slurm(wet_directory: str) -> list[str]:
     executor = submitit.AutoExecutor(folder="slurm_outputs")
     executor.update_parameters(
         timeout_min=30,
@@ -160,16 +314,10 @@ def main(config: ProcessWetFilesConfig):
     )
     future = executor.submit(
         get_files,
-        wet_directory="/data/CC",
+        wet_directory=wet_directory,
     )
     print(f"Job submitted with job id: {future.job_id}")
-    wet_filepaths = future.result()
-
-    if config.max_files is not None:
-        wet_filepaths = random.sample(wet_filepaths, config.max_files)
-
-    print(f"Job completed with {len(wet_filepaths)} files")
-    submit_job(wet_filepaths, config.output_path)
+    return future.result()
 
 if __name__ == "__main__":
     main()
@@ -1,9 +1,18 @@
-import fasttext
+import numpy as np
+from cs336_data.fasttext_models import load_model, predict_batch
 
-model = fasttext.load_model("fasttext_model.bin")
+def quality_model():
+    return load_model("quality")
 
 def classify_quality(text: str) -> str:
-    prediction = model.predict(text.replace("\n", " "))
+    prediction = quality_model().predict(text.replace("\n", " "))
 
     cleaned_prediction = (prediction[0][0].replace("__label__", ""), prediction[1][0])
     return cleaned_prediction
+
+def classify_quality_batch(texts: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Classify the quality of many documents with a single `predict` call.
+
+    Returns an array of labels ("hq"/"lq") and an array of their probabilities, aligned with `texts`.
+    """
+    return predict_batch(quality_model(), [text.replace("\n", " ") for text in texts])
@@ -1,6 +1,6 @@
 import fsspec
 from cs336_data.extraction import extract_text_from_html_bytes
-from cs336_data.mask_pii import mask_pii
+from cs336_data.mask_pii import mask_all_pii
 from fastwarc.warc import ArchiveIterator, WarcRecordType
 from fastwarc.stream_io import *
 
@@ -15,10 +15,8 @@ with fsspec.open('example_mask_pii.gz', 'w', compression="infer") as f:
         record_body = record.reader.read()
         record_text = extract_text_from_html_bytes(record_body)
         
-        total_num_changes = 0
-        for pii_type in ['email', 'phone_number', 'ip_address']:
-            record_text, num_changes = mask_pii(record_text, pii_type)
-            total_num_changes += num_changes
+        record_text, num_changes = mask_all_pii(record_text)
+        total_num_changes = sum(num_changes.values())
 
         f.write(f"=" * 50 + f"TOTAL NUM CHANGES: {total_num_changes}" + '=' * 50 + '\n')
         f.write(record_text + "\n")
@@ -0,0 +1,41 @@
+import time
+from pathlib import Path
+
+from cs336_data.minhash_deduplication import (
+    get_min_hash_signature,
+    get_min_hash_signature_vectorized,
+    get_shingles,
+    hash_shingles,
+    normalize_text,
+    rolling_shingle_hashes,
+)
+
+FIXTURES_PATH = Path(__file__).resolve().parents[2] / "tests" / "fixtures"
+NUM_REPEATS = 5
+
+
+def benchmark(signature_fn, texts, num_hashes, ngrams):
+    start_time = time.perf_counter()
+    for _ in range(NUM_REPEATS):
+        for text in texts:
+            signature_fn(text, num_hashes, ngrams)
+    return (time.perf_counter() - start_time) / (NUM_REPEATS * len(texts))
+
+
+if __name__ == "__main__":
+    texts = [normalize_text(path.read_text()) for path in FIXTURES_PATH.glob("**/*.txt")]
+    print(f"{len(texts)} documents, {sum(len(text) for text in texts) / len(texts):.0f} characters on average")
+    for use_char_ngrams in (True, False):
+        substrings = benchmark(lambda text, *_: hash_shingles(get_shingles(text, 5, use_char_ngrams)), texts, 0, 5)
+        rolling = benchmark(lambda text, *_: rolling_shingle_hashes(text, 5, use_char_ngrams), texts, 0, 5)
+        print(
+            f"{'character' if use_char_ngrams else 'word'} 5-gram hashes: substrings {substrings * 1e3:.2f} ms/doc, "
+            f"rolling {rolling * 1e3:.2f} ms/doc ({substrings / rolling:.1f}x)"
+        )
+    for num_hashes in (100, 256, 500):
+        reference = benchmark(get_min_hash_signature, texts, num_hashes, 5)
+        vectorized = benchmark(get_min_hash_signature_vectorized, texts, num_hashes, 5)
+        print(
+            f"num_hashes={num_hashes}: mmh3 per seed {reference * 1e3:.2f} ms/doc, "
+            f"vectorized {vectorized * 1e3:.2f} ms/doc ({reference / vectorized:.1f}x)"
+        )
@@ -0,0 +1,48 @@
+import re
+import string
+import sys
+import time
+import unicodedata
+
+from fastwarc.stream_io import FileStream, GZipStream
+from fastwarc.warc import ArchiveIterator, WarcRecordType
+
+from cs336_data.minhash_deduplication import normalize_texts
+
+WET_PATH = "/data/CC/example.warc.wet.gz"
+NUM_DOCUMENTS = 2000
+
+
+def reference_normalize_text(text: str) -> str:
+    """`normalize_text` as it was before the precomputed tables and the ASCII fast path."""
+    text = text.lower()
+    text = text.translate(str.maketrans('', '', string.punctuation))
+    text = re.sub(r'\s+', ' ', text)
+    return ''.join(c for c in unicodedata.normalize('NFD', text) if not unicodedata.combining(c))
+
+
+def read_wet_texts(wet_path: str, num_documents: int) -> list[str]:
+    texts = []
+    iterator = ArchiveIterator(GZipStream(FileStream(wet_path, 'rb')), record_types=WarcRecordType.conversion)
+    for record in iterator:
+        texts.append(record.reader.read().decode("utf-8", errors="replace"))
+        if len(texts) == num_documents:
+            break
+    return texts
+
+
+def benchmark(normalize, texts):
+    start_time = time.perf_counter()
+    normalized = normalize(texts)
+    return normalized, time.perf_counter() - start_time
+
+
+if __name__ == "__main__":
+    texts = read_wet_texts(sys.argv[1] if len(sys.argv) > 1 else WET_PATH, NUM_DOCUMENTS)
+    num_ascii = sum(text.isascii() for text in texts)
+    print(f"{len(texts)} documents ({num_ascii} pure ASCII), {sum(map(len, texts)) / 1e6:.1f}M characters")
+
+    reference, reference_seconds = benchmark(lambda texts: [reference_normalize_text(text) for text in texts], texts)
+    normalized, seconds = benchmark(normalize_texts, texts)
+    assert normalized == reference, "normalize_texts output differs from the reference implementation"
+    print(f"reference {reference_seconds:.2f}s, normalize_texts {seconds:.2f}s ({reference_seconds / seconds:.1f}x)")
@@ -0,0 +1,204 @@
+import os
+import glob
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+import draccus
+import mmh3
+import numpy as np
+
+from cs336_data.executors import Backend, run_tasks
+
+INDEX_SUFFIX = ".idx.npz"
+# One row per WARC record; content_type indexes into the index's table of distinct content types
+warc_index_dtype = np.dtype([
+    ("offset", np.uint64),
+    ("length", np.uint64),
+    ("record_type", np.uint32),
+    ("uri_hash", np.uint64),
+    ("content_type", np.uint16),
+])
+
+
+def warc_index_path(warc_path: str, index_directory: str | None = None) -> str:
+    """
+    Where the index of `warc_path` is kept: next to it, or in `index_directory` under a name that also hashes
+    its absolute path, so WARCs with the same name in different directories do not share an index.
+    """
+    if index_directory is None:
+        return f"{warc_path}{INDEX_SUFFIX}"
+    path_hash = mmh3.hash64(os.path.abspath(warc_path), signed=False)[0]
+    return os.path.join(index_directory, f"{os.path.basename(warc_path)}.{path_hash:016x}{INDEX_SUFFIX}")
+
+
+def hash_uri(uri: str | None) -> int:
+    return mmh3.hash64(uri, signed=False)[0] if uri else 0
+
+
+@dataclass
+class WarcIndex:
+    """
+    The position, type, target URI hash and content type of every record in a WARC/WET file. Common Crawl
+    files compress every record as its own gzip member, so a record can be read by seeking to its offset.
+    """
+    records: np.ndarray
+    content_types: list[str]
+    # Size of the WARC file the index was built from, to notice when it has been replaced
+    warc_size: int
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def mask(self, record_type: int | None = None, content_types: Iterable[str] | None = None) -> np.ndarray:
+        """
+        Boolean mask of the records of `record_type` (a `WarcRecordType`) with one of `content_types`, compared
+        case-insensitively; "" matches the records without a Content-Type.
+        """
+        mask = np.ones(len(self.records), dtype=bool)
+        if record_type is not None:
+            mask &= self.records["record_type"] == int(record_type)
+        if content_types is not None:
+            content_types = {content_type.lower() for content_type in content_types}
+            codes = [
+                code for code, content_type in enumerate(self.content_types) if content_type.lower() in content_types
+            ]
+            mask &= np.isin(self.records["content_type"], codes)
+        return mask
+
+    def count(self, record_type: int | None = None, content_types: Iterable[str] | None = None) -> int:
+        return int(np.count_nonzero(self.mask(record_type, content_types)))
+
+    def offsets(self, record_type: int | None = None, content_types: Iterable[str] | None = None) -> np.ndarray:
+        return self.records["offset"][self.mask(record_type, content_types)]
+
+
+def scan_warc_index(warc_path: str) -> WarcIndex:
+    """Indexes every record of `warc_path` in one pass, without reading any payload."""
+    from fastwarc.warc import ArchiveIterator
+
+    offsets, record_types, uri_hashes, content_type_codes = [], [], [], []
+    content_type_table: dict[str, int] = {}
+    with open(warc_path, "rb") as f_warc:
+        for record in ArchiveIterator(f_warc):
+            if record.is_http:
+                content_type = record.http_content_type or ""
+            else:
+                content_type = record.headers.get("Content-Type", "")
+            # MIME types are case-insensitive, and the converter's prefilter compares them lowercased
+            content_type = content_type.lower()
+            offsets.append(record.stream_pos)
+            record_types.append(int(record.record_type))
+            uri_hashes.append(hash_uri(record.headers.get("WARC-Target-URI")))
+            content_type_codes.append(content_type_table.setdefault(content_type, len(content_type_table)))
+
+    warc_size = os.path.getsize(warc_path)
+    records = np.zeros(len(offsets), dtype=warc_index_dtype)
+    records["offset"] = offsets
+    # Every record runs until the next one starts
+    records["length"] = np.diff(np.append(records["offset"], np.uint64(warc_size)))
+    records["record_type"] = record_types
+    records["uri_hash"] = uri_hashes
+    records["content_type"] = content_type_codes
+    return WarcIndex(records, list(content_type_table), warc_size)
+
+
+def save_warc_index(index: WarcIndex, index_path: str):
+    os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+    temporary_path = f"{index_path}.tmp"
+    with open(temporary_path, "wb") as f_index:
+        np.savez(
+            f_index,
+            records=index.records,
+            content_types=np.array(index.content_types, dtype=str),
+            warc_size=index.warc_size,
+        )
+    os.replace(temporary_path, index_path)
+
+
+def build_warc_index(warc_path: str, index_path: str | None = None) -> WarcIndex:
+    """Indexes `warc_path` with `scan_warc_index` and saves the index next to it (or at `index_path`)."""
+    index = scan_warc_index(warc_path)
+    save_warc_index(index, index_path or warc_index_path(warc_path))
+    return index
+
+
+def load_warc_index(
+    warc_path: str,
+    index_path: str | None = None,
+    build: bool = True,
+    index_directory: str | None = None,
+) -> WarcIndex:
+    """
+    Loads the index of `warc_path` (see `warc_index_path`), building it first if it is missing or stale (and
+    `build` is set). When the index cannot be saved, e.g. next to a WARC on a read-only file system, the
+    freshly scanned index is returned without saving it, so the caller still gets its counts from one pass.
+    """
+    index_path = index_path or warc_index_path(warc_path, index_directory)
+    if os.path.exists(index_path):
+        with np.load(index_path) as arrays:
+            index = WarcIndex(arrays["records"], arrays["content_types"].tolist(), int(arrays["warc_size"]))
+        if index.warc_size == os.path.getsize(warc_path):
+            return index
+    if not build:
+        raise FileNotFoundError(f"No up-to-date index for {warc_path} at {index_path}")
+    index = scan_warc_index(warc_path)
+    try:
+        save_warc_index(index, index_path)
+    except OSError as error:
+        print(f"Could not save the index of {warc_path} at {index_path} ({error}); using it unsaved")
+    return index
+
+
+def iter_records_at(warc_path: str, offsets: Iterable[int]) -> Iterator:
+    """
+    Yields the record starting at each offset, seeking straight to it. A record must be read before the
+    next one is requested.
+    """
+    from fastwarc.warc import ArchiveIterator
+
+    with open(warc_path, "rb") as f_warc:
+        for offset in offsets:
+            f_warc.seek(int(offset))
+            yield next(iter(ArchiveIterator(f_warc)))
+
+
+def index_warc_file(warc_path: str, index_directory: str | None = None) -> int:
+    """Indexing task: builds the index of `warc_path` unless an up-to-date one exists, and returns its number of records."""
+    return len(load_warc_index(warc_path, index_directory=index_directory))
+
+
+def count_warc_records(
+    warc_path: str,
+    record_type: int | None = None,
+    content_types: list[str] | None = None,
+    index_directory: str | None = None,
+) -> int:
+    """Counting task: `WarcIndex.count` over the index of `warc_path`, built (and saved if possible) when missing."""
+    return load_warc_index(warc_path, index_directory=index_directory).count(record_type, content_types)
+
+
+@dataclass
+class WarcIndexConfig:
+    # Glob of the WARC/WET files to index
+    input_glob: str = "/data/CC/*.warc.wet.gz"
+    # Where the indexes are saved; defaults to next to each file, which needs write access to its directory
+    index_directory: str | None = None
+    backend: Backend = "local"
+    num_workers: int | None = None
+
+
+@draccus.wrap()
+def main(config: WarcIndexConfig):
+    warc_paths = sorted(glob.glob(config.input_glob))
+    num_records = run_tasks(
+        index_warc_file,
+        [(warc_path, config.index_directory) for warc_path in warc_paths],
+        config.backend,
+        config.num_workers,
+        desc="Indexing",
+    )
+    print(f"Indexed {sum(num_records)} records in {len(warc_paths)} files")
+
+
+if __name__ == "__main__":
+    main()
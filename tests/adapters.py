@@ -3,10 +3,10 @@ from __future__ import annotations
 import os
 from typing import Any
 from cs336_data.extraction import extract_text_from_html_bytes
-from cs336_data.language_identification import identify_language
-from cs336_data.mask_pii import mask_pii
+from cs336_data.language_identification import identify_language, identify_language_batch
+from cs336_data.mask_pii import PII_TYPES, mask_all_pii, mask_pii
 from cs336_data.nsfw_detection import classify
-from cs336_data.gopher import check_gopher_filters
+from cs336_data.gopher import check_gopher_filters, check_gopher_filters_with_stats
 from cs336_data.quality_classify import classify_quality
 from cs336_data.exact_line_deduplication import exact_line_deduplication
 from cs336_data.minhash_deduplication import minhash_deduplication
@@ -19,6 +19,10 @@ def run_identify_language(text: str) -> tuple[Any, float]:
     return identify_language(text)
 
 
+def run_identify_language_batch(texts: list[str]) -> tuple[Any, Any]:
+    return identify_language_batch(texts)
+
+
 def run_mask_emails(text: str) -> tuple[str, int]:
     return mask_pii(text, "email")
 
@@ -31,6 +35,10 @@ def run_mask_ips(text: str) -> tuple[str, int]:
     return mask_pii(text, "ip_address")
 
 
+def run_mask_all_pii(text: str, types: list[str] = PII_TYPES) -> tuple[str, dict[str, int]]:
+    return mask_all_pii(text, types)
+
+
 def run_classify_nsfw(text: str) -> tuple[Any, float]:
     return classify(text, "nsfw")
 
@@ -47,6 +55,10 @@ def run_gopher_quality_filter(text: str) -> bool:
     return check_gopher_filters(text)
 
 
+def run_gopher_quality_filter_with_stats(text: str, tokenizer: str = "nltk") -> tuple[bool, Any]:
+    return check_gopher_filters_with_stats(text, tokenizer=tokenizer)
+
+
 def run_exact_line_deduplication(
     input_files: list[os.PathLike], output_directory: os.PathLike
 ):
@@ -0,0 +1,195 @@
+import io
+import math
+import random
+from collections import Counter
+
+from fastwarc.stream_io import FileStream, GZipStream
+from fastwarc.warc import ArchiveIterator
+from warcio.statusandheaders import StatusAndHeaders
+from warcio.warcwriter import WARCWriter
+
+from cs336_data.convert_warc_to_text import (
+    WARC_RECORD_RESPONSE_ENUM_FLAG,
+    apportion_quota,
+    convert_warc_files,
+    count_sampling,
+    iter_html_records,
+    iter_prefiltered_records,
+    merge_and_shuffle,
+    reservoir_sample,
+    shard_seed,
+)
+
+
+def write_warc_file(path, responses):
+    with open(path, "wb") as f_out:
+        writer = WARCWriter(f_out, gzip=True)
+        for i, (status, content_type, body) in enumerate(responses):
+            headers = [("Content-Type", content_type)] if content_type is not None else []
+            http_headers = StatusAndHeaders(status, headers, protocol="HTTP/1.1")
+            record = writer.create_warc_record(
+                f"http://example.com/{i}",
+                "response",
+                payload=io.BytesIO(body),
+                http_headers=http_headers,
+            )
+            writer.write_record(record)
+
+
+def read_warc_records(path):
+    return ArchiveIterator(GZipStream(FileStream(str(path), "rb")), record_types=WARC_RECORD_RESPONSE_ENUM_FLAG)
+
+
+def test_iter_html_records_skips_by_headers(tmp_path):
+    path = tmp_path / "responses.warc.gz"
+    write_warc_file(path, [
+        ("200 OK", "text/html; charset=utf-8", b"<p>kept</p>"),
+        ("200 OK", "image/png", b"\x89PNG"),
+        ("404 Not Found", "text/html", b"<p>missing</p>"),
+        ("200 OK", "text/html", b"<p>" + b"x" * 100 + b"</p>"),
+        ("200 OK", "application/xhtml+xml", b"<p>also kept</p>"),
+    ])
+
+    report = Counter()
+    records = list(iter_html_records(read_warc_records(path), report, max_record_bytes=64))
+    assert records == [
+        (b"<p>kept</p>", "text/html; charset=utf-8"),
+        (b"<p>also kept</p>", "application/xhtml+xml"),
+    ]
+    assert report == Counter(
+        num_records=5, num_extracted=2, skipped_content_type=1, skipped_status=1, skipped_too_large=1
+    )
+
+
+def test_reservoir_sample_is_uniform_and_reads_few_items():
+    random.seed(0)
+    num_items, sample_count, num_trials = 1000, 10, 2000
+    counts = Counter()
+    num_reads = 0
+
+    def read(item):
+        nonlocal num_reads
+        num_reads += 1
+        return item
+
+    for _ in range(num_trials):
+        sample = reservoir_sample(range(num_items), sample_count, read)
+        assert len(set(sample)) == sample_count
+        counts.update(sample)
+    assert reservoir_sample(range(3), sample_count) == [0, 1, 2]
+
+    # Every item is expected in sample_count / num_items of the samples
+    expected = num_trials * sample_count / num_items
+    assert all(abs(counts[item] - expected) < 5 * expected**0.5 for item in range(num_items))
+    # About k (1 + ln(n / k)) reads per sample instead of n
+    assert num_reads / num_trials < 2 * sample_count * (1 + math.log(num_items / sample_count))
+
+
+def test_count_sampling_extracts_only_the_sample(tmp_path):
+    path = tmp_path / "responses.warc.gz"
+    write_warc_file(path, [("200 OK", "text/html", f"<p>page {i}</p>".encode()) for i in range(20)])
+    output_path = tmp_path / "sample.txt"
+
+    report = Counter()
+    records = iter_prefiltered_records(read_warc_records(path), report)
+    assert count_sampling(records, str(output_path), 5, "hq") == 5
+    lines = output_path.read_text().splitlines()
+    assert len(set(lines)) == 5
+    assert all(line.startswith("__label__hq page ") for line in lines)
+    assert report["num_records"] == 20
+
+
+def test_apportion_quota_meets_quota_in_proportion():
+    assert apportion_quota([10, 20, 30], 6) == [1, 2, 3]
+    assert apportion_quota([5, 5, 5], 4) == [2, 1, 1]
+    assert apportion_quota([3, 0, 2], 10) == [3, 0, 2]
+
+
+def test_merge_and_shuffle_keeps_every_line(tmp_path):
+    input_paths = []
+    for shard_idx in range(3):
+        input_path = tmp_path / f"shard{shard_idx}.txt"
+        input_path.write_text("".join(f"__label__hq {shard_idx} {i}\r\n{i}\n" for i in range(50)), newline="")
+        input_paths.append(str(input_path))
+
+    output_path = tmp_path / "merged.txt"
+    merge_and_shuffle(input_paths, str(output_path), seed=0, memory_limit=500)
+    with open(output_path, newline="\n") as f_merged:
+        merged = f_merged.readlines()
+    expected = []
+    for input_path in input_paths:
+        with open(input_path, newline="\n") as f_input:
+            expected.extend(f_input.readlines())
+    assert sorted(merged) == sorted(expected)
+    assert merged != expected
+
+
+def test_convert_warc_files_meets_global_quota_reproducibly(tmp_path):
+    input_paths = []
+    for shard_idx, num_pages in enumerate([10, 20, 30]):
+        input_path = tmp_path / f"shard{shard_idx}.warc.gz"
+        pages = [("200 OK", "text/html", f"<p>page {shard_idx}-{i}</p>".encode()) for i in range(num_pages)]
+        write_warc_file(input_path, pages + [("200 OK", "image/png", b"\x89PNG")])
+        input_paths.append(str(input_path))
+
+    outputs = []
+    for run in range(2):
+        output_path = tmp_path / f"run{run}.txt"
+        report = convert_warc_files(input_paths, str(output_path), "hq", "count", sample_count=12, num_workers=2)
+        assert report["num_extracted"] == 12
+        outputs.append(output_path.read_text().splitlines())
+        assert not (tmp_path / f"run{run}.txt.shards").exists()
+
+    assert outputs[0] == outputs[1]
+    assert len(set(outputs[0])) == 12
+    assert Counter(line.split()[2].split("-")[0] for line in outputs[0]) == {"0": 2, "1": 4, "2": 6}
+
+
+def test_convert_warc_files_keeps_warcs_with_the_same_name_apart(tmp_path):
+    input_paths = []
+    for crawl in ["crawl-a", "crawl-b"]:
+        input_path = tmp_path / crawl / "shard.warc.gz"
+        input_path.parent.mkdir()
+        write_warc_file(input_path, [("200 OK", "text/html", f"<p>{crawl} page {i}</p>".encode()) for i in range(5)])
+        input_paths.append(str(input_path))
+
+    output_path = tmp_path / "out.txt"
+    report = convert_warc_files(input_paths, str(output_path), "hq", num_workers=2)
+    assert report["num_extracted"] == 10
+    lines = output_path.read_text().splitlines()
+    assert Counter(line.split()[1] for line in lines) == {"crawl-a": 5, "crawl-b": 5}
+    assert shard_seed(42, input_paths[0], str(tmp_path)) != shard_seed(42, input_paths[1], str(tmp_path))
+
+
+def test_convert_warc_files_counts_responses_like_the_prefilter(tmp_path):
+    input_paths = []
+    for shard_idx, (content_type, num_pages) in enumerate([("Text/HTML", 10), (None, 10), ("text/html", 20)]):
+        input_path = tmp_path / f"shard{shard_idx}.warc.gz"
+        pages = [("200 OK", content_type, f"<p>page {shard_idx}-{i}</p>".encode()) for i in range(num_pages)]
+        write_warc_file(input_path, pages)
+        input_paths.append(str(input_path))
+
+    output_path = tmp_path / "out.txt"
+    report = convert_warc_files(
+        input_paths, str(output_path), "hq", "count", sample_count=8, num_workers=2, index_directory=str(tmp_path / "indexes")
+    )
+    assert report["num_extracted"] == 8
+    assert len(list((tmp_path / "indexes").iterdir())) == 3
+    assert not list(tmp_path.glob("*.idx.npz"))
+    lines = output_path.read_text().splitlines()
+    assert Counter(line.split()[2].split("-")[0] for line in lines) == {"0": 2, "1": 2, "2": 4}
+
+
+def test_convert_warc_files_only_splits_sample_count_when_counting(tmp_path):
+    input_paths = []
+    for shard_idx, num_pages in enumerate([1, 9]):
+        input_path = tmp_path / f"shard{shard_idx}.warc.gz"
+        pages = [("200 OK", "text/html", f"<p>page {shard_idx}-{i}</p>".encode()) for i in range(num_pages)]
+        write_warc_file(input_path, pages)
+        input_paths.append(str(input_path))
+
+    output_path = tmp_path / "out.txt"
+    report = convert_warc_files(input_paths, str(output_path), "hq", "probability", sample_count=2, num_workers=2)
+    # Every record is kept at the default sampling rate, including the WARC whose share of 2 would be 0
+    assert report["num_extracted"] == 10
+    assert len(output_path.read_text().splitlines()) == 10
@@ -1,7 +1,46 @@
 import logging
 
+import gzip
+import json
+import re
+import string
+import unicodedata
+
+import numpy as np
+import pytest
 from xopen import xopen
 
+from cs336_data.exact_line_dedupe_warc import (
+    exact_line_deduplication_warc,
+    exact_line_deduplication_warc_mapreduce,
+    paragraph_deduplication_warc,
+)
+from cs336_data.bloom_filter import ScalableBloomFilter
+from cs336_data import dedup_index
+from cs336_data.dedup_index import DedupIndex
+from cs336_data.exact_line_deduplication import exact_line_deduplication
+from cs336_data.line_hash_index import LineHashCounter, hash_lines, merge_counts
+from cs336_data.minhash_deduplication import (
+    ShingleSetCache,
+    UnionFind,
+    connected_component_roots,
+    duplicate_rows_from_edges,
+    estimate_jaccard_similarity,
+    exact_jaccard_similarity,
+    find_duplicate_rows,
+    get_char_ngrams,
+    get_min_hash_signature_vectorized,
+    get_shingle_set,
+    get_shingles,
+    minhash_deduplication,
+    minhash_deduplication_streaming,
+    normalize_text,
+    normalize_texts,
+    parallel_lsh_edges,
+    rolling_shingle_hashes,
+    signature_record_dtype,
+)
+
 from .adapters import run_exact_line_deduplication, run_minhash_deduplication
 from .common import FIXTURES_PATH
 
@@ -40,6 +79,84 @@ def test_exact_line_deduplication(tmp_path):
     assert len(deduplicated_documents) == 0
 
 
+def test_line_hash_counter_spills_to_disk(tmp_path):
+    rng = np.random.default_rng(0)
+    hashes = rng.integers(0, 2**64, size=1000, dtype=np.uint64)
+    repeated = np.concatenate([hashes, hashes[:100], hashes[50:60]])
+    rng.shuffle(repeated)
+
+    spill_directory = tmp_path / "spill"
+    with LineHashCounter(memory_limit=800, num_partitions=16, spill_directory=str(spill_directory)) as counts:
+        for chunk in np.array_split(repeated, 37):
+            counts.add(chunk)
+        assert any(spill_directory.iterdir())
+        duplicates = counts.duplicates()
+
+    np.testing.assert_array_equal(duplicates, np.sort(hashes[:100]))
+    assert counts.num_unique == 1000
+    assert not any(spill_directory.iterdir())
+
+
+def test_exact_line_deduplication_with_small_memory_limit(tmp_path):
+    documents_with_line_duplicates_paths = list(
+        (FIXTURES_PATH / "documents_with_line_duplicates").glob("doc*.txt")
+    )
+    run_exact_line_deduplication(
+        input_files=documents_with_line_duplicates_paths, output_directory=tmp_path / "in_memory"
+    )
+    exact_line_deduplication(
+        documents_with_line_duplicates_paths, tmp_path / "spilled", memory_limit=256, spill_directory=tmp_path / "spill"
+    )
+    for path in documents_with_line_duplicates_paths:
+        assert (tmp_path / "spilled" / path.name).read_text() == (tmp_path / "in_memory" / path.name).read_text()
+
+
+def test_exact_line_deduplication_warc_mapreduce_matches_single_process(tmp_path):
+    rng = np.random.default_rng(0)
+    input_files = []
+    for file_idx in range(4):
+        input_file = tmp_path / "documents" / f"{file_idx}.jsonl.gz"
+        input_file.parent.mkdir(exist_ok=True)
+        with gzip.open(input_file, "wt", encoding="utf-8") as f_out:
+            for _ in range(200):
+                f_out.write(json.dumps({"text": f"document {rng.integers(0, 500)}"}) + "\n")
+            f_out.write("not json\n")
+            f_out.write(json.dumps({"text": ""}) + "\n")
+        input_files.append(str(input_file))
+
+    exact_line_deduplication_warc(input_files, str(tmp_path / "single"))
+    exact_line_deduplication_warc_mapreduce(
+        input_files, str(tmp_path / "mapreduce"), str(tmp_path / "shards"), num_partitions=8, num_workers=2
+    )
+    for input_file in input_files:
+        name = input_file.split("/")[-1]
+        with gzip.open(tmp_path / "single" / name, "rt") as f_single:
+            with gzip.open(tmp_path / "mapreduce" / name, "rt") as f_mapreduce:
+                assert f_single.read() == f_mapreduce.read()
+
+
+def test_exact_line_deduplication_warc_mapreduce_ignores_stale_shards(tmp_path):
+    def write_documents(directory, num_files, texts):
+        input_files = []
+        for file_idx in range(num_files):
+            input_file = tmp_path / directory / f"{file_idx}.jsonl.gz"
+            input_file.parent.mkdir(exist_ok=True)
+            with gzip.open(input_file, "wt", encoding="utf-8") as f_out:
+                for text in texts:
+                    f_out.write(json.dumps({"text": text}) + "\n")
+            input_files.append(str(input_file))
+        return input_files
+
+    # A first run over more files leaves shards behind for file indices the second run does not have
+    earlier_files = write_documents("earlier", 4, ["shared line"])
+    exact_line_deduplication_warc_mapreduce(earlier_files, str(tmp_path / "earlier-out"), str(tmp_path / "shards"))
+    input_files = write_documents("documents", 1, ["shared line", "unique line"])
+    exact_line_deduplication_warc_mapreduce(input_files, str(tmp_path / "mapreduce"), str(tmp_path / "shards"))
+
+    with gzip.open(tmp_path / "mapreduce" / "0.jsonl.gz", "rt") as f_mapreduce:
+        assert [json.loads(line)["text"] for line in f_mapreduce] == ["shared line", "unique line"]
+
+
 def test_minhash_deduplication_exact_duplicates(tmp_path):
     """
     Check that minhash deduplication properly identifies and removes exact duplicates.
@@ -130,3 +247,370 @@ def test_minhash_deduplication_fuzzy_duplicates(tmp_path):
     assert len(deduplicated_documents) == 0
     # One of the kept deduplicated documents should be kept, and the other should be removed.
     assert len(kept_duplicated_documents) == 1
+
+
+def test_vectorized_min_hash_signature_estimates_jaccard():
+    paths = sorted((FIXTURES_PATH / "documents_with_fuzzy_duplicates").glob("*.txt"))
+    texts = [normalize_text(path.read_text()) for path in paths]
+    signatures = [get_min_hash_signature_vectorized(text, 500, 5) for text in texts]
+    assert all(signature.dtype == np.uint32 and signature.shape == (500,) for signature in signatures)
+    np.testing.assert_array_equal(signatures[0], get_min_hash_signature_vectorized(texts[0], 500, 5))
+
+    for i in range(len(texts)):
+        for j in range(i + 1, len(texts)):
+            shingles_i, shingles_j = set(get_char_ngrams(texts[i], 5)), set(get_char_ngrams(texts[j], 5))
+            jaccard = len(shingles_i & shingles_j) / len(shingles_i | shingles_j)
+            assert abs(estimate_jaccard_similarity(signatures[i], signatures[j]) - jaccard) < 0.1
+
+
+def test_minhash_deduplication_vectorized_matches_reference(tmp_path):
+    paths = list((FIXTURES_PATH / "documents_with_fuzzy_duplicates").glob("*.txt"))
+    for vectorized in (False, True):
+        minhash_deduplication(
+            paths, 500, 50, 5, 0.8, tmp_path / str(vectorized), vectorized=vectorized
+        )
+    assert sorted(path.name for path in (tmp_path / "False").iterdir()) == sorted(
+        path.name for path in (tmp_path / "True").iterdir()
+    )
+
+
+def test_minhash_deduplication_streaming_matches_in_memory(tmp_path):
+    paths = list((FIXTURES_PATH / "documents_with_fuzzy_duplicates").glob("*.txt"))
+    minhash_deduplication(paths, 500, 50, 5, 0.8, tmp_path / "in_memory", vectorized=True)
+    minhash_deduplication_streaming(paths, 500, 50, 5, 0.8, tmp_path / "streaming", work_directory=tmp_path / "work")
+
+    in_memory = {path.name: path.read_text() for path in (tmp_path / "in_memory").iterdir()}
+    streaming = {path.name: path.read_text() for path in (tmp_path / "streaming").iterdir()}
+    assert streaming == in_memory
+    assert list((tmp_path / "work").iterdir()) == []
+
+
+def test_minhash_deduplication_streaming_jsonl_shards(tmp_path):
+    texts = [path.read_text() for path in sorted((FIXTURES_PATH / "documents_with_fuzzy_duplicates").glob("*.txt"))]
+    # Every document appears once in each shard, plus a malformed line that is dropped
+    for shard_idx in range(2):
+        with gzip.open(tmp_path / f"shard{shard_idx}.jsonl.gz", "wt") as f:
+            for text in texts:
+                f.write(json.dumps({"text": text}) + "\n")
+            f.write("not json\n")
+
+    shards = [tmp_path / "shard0.jsonl.gz", tmp_path / "shard1.jsonl.gz"]
+    minhash_deduplication_streaming(shards, 500, 50, 5, 0.8, tmp_path / "out")
+    kept = {}
+    for shard in shards:
+        with gzip.open(tmp_path / "out" / shard.name, "rt") as f:
+            kept[shard.name] = [json.loads(line)["text"] for line in f]
+
+    assert kept["shard1.jsonl.gz"] == []
+    assert len(kept["shard0.jsonl.gz"]) == len(texts) - 1
+    assert set(kept["shard0.jsonl.gz"]) <= set(texts)
+
+
+def test_minhash_deduplication_union_find_clusters(tmp_path):
+    texts = [path.read_text() for path in sorted((FIXTURES_PATH / "documents_with_fuzzy_duplicates").glob("*.txt"))]
+    # Ten copies of every document form one cluster each, except the two MIT licenses which merge
+    with gzip.open(tmp_path / "shard.jsonl.gz", "wt") as f:
+        for _ in range(10):
+            for text in texts:
+                f.write(json.dumps({"text": text}) + "\n")
+
+    for clustering in ("pairs", "union_find"):
+        minhash_deduplication_streaming(
+            [tmp_path / "shard.jsonl.gz"],
+            500,
+            50,
+            5,
+            0.8,
+            tmp_path / clustering,
+            clustering=clustering,
+            histogram_path=str(tmp_path / "histogram.json") if clustering == "union_find" else None,
+        )
+
+    with gzip.open(tmp_path / "pairs" / "shard.jsonl.gz", "rt") as f:
+        kept_pairs = f.readlines()
+    with gzip.open(tmp_path / "union_find" / "shard.jsonl.gz", "rt") as f:
+        kept_union_find = f.readlines()
+    assert kept_union_find == kept_pairs
+    assert len(kept_union_find) == len(texts) - 1
+
+    with open(tmp_path / "histogram.json") as f:
+        histogram = json.load(f)
+    assert histogram == {"10": len(texts) - 2, "20": 1}
+
+
+def test_minhash_deduplication_parallel_banding(tmp_path):
+    texts = [path.read_text() for path in sorted((FIXTURES_PATH / "documents_with_fuzzy_duplicates").glob("*.txt"))]
+    with gzip.open(tmp_path / "shard.jsonl.gz", "wt") as f:
+        for _ in range(5):
+            for text in texts:
+                f.write(json.dumps({"text": text}) + "\n")
+
+    for clustering in ("pairs", "union_find"):
+        for backend in (None, "local"):
+            output_directory = tmp_path / f"{clustering}-{backend}"
+            minhash_deduplication_streaming(
+                [tmp_path / "shard.jsonl.gz"],
+                500,
+                50,
+                5,
+                0.8,
+                output_directory,
+                clustering=clustering,
+                backend=backend,
+                num_workers=2,
+            )
+        with gzip.open(tmp_path / f"{clustering}-None" / "shard.jsonl.gz", "rt") as f:
+            sequential = f.readlines()
+        with gzip.open(tmp_path / f"{clustering}-local" / "shard.jsonl.gz", "rt") as f:
+            parallel = f.readlines()
+        assert parallel == sequential
+        assert len(parallel) == len(texts) - 1
+
+
+def test_shingle_set_cache_exact_jaccard():
+    paths = sorted((FIXTURES_PATH / "documents_with_fuzzy_duplicates").glob("*.txt"))
+    texts = [normalize_text(path.read_text()) for path in paths]
+    shingle_sets = [get_shingle_set(text, 5) for text in texts]
+    # Room for roughly one shingle set, so most lookups are evicted and reloaded
+    cache = ShingleSetCache(lambda doc_idx: get_shingle_set(texts[doc_idx], 5), max_bytes=shingle_sets[0].nbytes)
+    for doc_idx, shingle_set in enumerate(shingle_sets):
+        cache.put(doc_idx, shingle_set)
+
+    for i in range(len(texts)):
+        for j in range(i + 1, len(texts)):
+            shingles_i, shingles_j = set(get_char_ngrams(texts[i], 5)), set(get_char_ngrams(texts[j], 5))
+            jaccard = len(shingles_i & shingles_j) / len(shingles_i | shingles_j)
+            assert cache.jaccard(i, j) == jaccard == exact_jaccard_similarity(shingle_sets[i], shingle_sets[j])
+    assert cache.num_misses > 0
+    assert cache.num_bytes <= 2 * max(shingle_set.nbytes for shingle_set in shingle_sets)
+
+
+def test_minhash_deduplication_exact_verification(tmp_path):
+    paths = list((FIXTURES_PATH / "documents_with_fuzzy_duplicates").glob("*.txt"))
+    minhash_deduplication(paths, 500, 50, 5, 0.8, tmp_path / "in_memory", exact_verification=True)
+    minhash_deduplication_streaming(
+        paths, 500, 50, 5, 0.8, tmp_path / "streaming", exact_verification=True, shingle_cache_bytes=0
+    )
+    minhash_deduplication_streaming(
+        paths, 500, 50, 5, 0.8, tmp_path / "parallel", exact_verification=True, backend="local", num_workers=2
+    )
+
+    in_memory = sorted(path.name for path in (tmp_path / "in_memory").iterdir())
+    assert sorted(path.name for path in (tmp_path / "streaming").iterdir()) == in_memory
+    assert sorted(path.name for path in (tmp_path / "parallel").iterdir()) == in_memory
+    assert len(in_memory) == 2
+
+
+def test_dedup_index_persists_line_counts(tmp_path):
+    (tmp_path / "first.txt").write_text("header\nonly in first\nheader\n")
+    (tmp_path / "second.txt").write_text("header\nonly in second\nalso new\n")
+    index_directory = str(tmp_path / "index")
+
+    exact_line_deduplication([str(tmp_path / "first.txt")], str(tmp_path / "out1"), index_directory=index_directory)
+    exact_line_deduplication([str(tmp_path / "second.txt")], str(tmp_path / "out2"), index_directory=index_directory)
+    assert (tmp_path / "out1" / "first.txt").read_text() == "only in first\n"
+    assert (tmp_path / "out2" / "second.txt").read_text() == "only in second\nalso new\n"
+
+    index = DedupIndex.open(index_directory)
+    assert index.version == 2 and len(index.segments) == 2
+    assert isinstance(index.segments[0].line_hashes, np.memmap)
+    hashes = hash_lines(["header\n", "only in first\n", "never seen\n"])
+    np.testing.assert_array_equal(index.line_counts(hashes), [3, 1, 0])
+
+    index.compact()
+    index = DedupIndex.open(index_directory)
+    assert index.version == 3 and len(index.segments) == 1
+    np.testing.assert_array_equal(index.line_counts(hashes), [3, 1, 0])
+
+
+def test_dedup_index_rejects_other_parameters(tmp_path):
+    DedupIndex.open(str(tmp_path), num_hashes=100, num_bands=10).add(signatures=np.zeros((1, 100), dtype=np.uint32))
+    with pytest.raises(ValueError):
+        DedupIndex.open(str(tmp_path), num_hashes=500, num_bands=50)
+
+    with open(tmp_path / "manifest.json") as f:
+        manifest = json.load(f)
+    with open(tmp_path / "manifest.json", "w") as f:
+        json.dump({**manifest, "format_version": -1}, f)
+    with pytest.raises(ValueError):
+        DedupIndex.open(str(tmp_path), num_hashes=100, num_bands=10)
+
+
+def test_dedup_index_open_does_not_rewrite_manifest(tmp_path):
+    DedupIndex.open(str(tmp_path), num_hashes=100, num_bands=10)
+    manifest_mtime = (tmp_path / "manifest.json").stat().st_mtime_ns
+    for _ in range(2):
+        DedupIndex.open(str(tmp_path))
+        DedupIndex.open(str(tmp_path), num_hashes=100, num_bands=10)
+    assert (tmp_path / "manifest.json").stat().st_mtime_ns == manifest_mtime
+
+
+@pytest.mark.parametrize("query_block_size", [1, 1 << 16])
+def test_dedup_index_finds_near_duplicates_deeper_in_a_bucket(tmp_path, monkeypatch, query_block_size):
+    monkeypatch.setattr(dedup_index, "QUERY_BLOCK_SIZE", query_block_size)
+    # Every indexed row shares the first band with the queries; only the last one is a near-duplicate
+    indexed = np.zeros((5, 8), dtype=np.uint32)
+    indexed[:4, 2:] = np.arange(1, 5)[:, None]
+    indexed[4, 2:] = [9, 9, 9, 9, 9, 8]
+    index = DedupIndex.open(str(tmp_path), num_hashes=8, num_bands=4)
+    index.add(signatures=indexed)
+
+    queries = np.zeros((2, 8), dtype=np.uint32)
+    queries[0, 2:] = 9
+    queries[1, 2:] = 7
+    assert index.query_documents(queries, 0.8).tolist() == [True, False]
+
+
+def test_merge_counts_is_exact_for_large_counts():
+    counts = np.array([2**60 + 1, 1, 7], dtype=np.uint64)
+    unique, totals = merge_counts(np.array([5, 5, 3], dtype=np.uint64), counts)
+    assert unique.tolist() == [3, 5]
+    assert totals.tolist() == [7, 2**60 + 2]
+
+
+def test_minhash_deduplication_against_index(tmp_path):
+    fixtures = FIXTURES_PATH / "documents_with_fuzzy_duplicates"
+    index_directory = str(tmp_path / "index")
+    minhash_deduplication_streaming(
+        [fixtures / "rails_mit_license.txt"], 500, 50, 5, 0.8, tmp_path / "out1", index_directory=index_directory
+    )
+    minhash_deduplication_streaming(
+        [fixtures / "react_mit_license.txt", fixtures / "pytorch_license.txt"],
+        500,
+        50,
+        5,
+        0.8,
+        tmp_path / "out2",
+        index_directory=index_directory,
+    )
+
+    assert [path.name for path in (tmp_path / "out1").iterdir()] == ["rails_mit_license.txt"]
+    assert [path.name for path in (tmp_path / "out2").iterdir()] == ["pytorch_license.txt"]
+    assert DedupIndex.open(index_directory, 500, 50).num_documents == 2
+
+
+def test_normalize_texts_matches_reference():
+    def reference_normalize_text(text):
+        text = text.lower()
+        text = text.translate(str.maketrans("", "", string.punctuation))
+        text = re.sub(r"\s+", " ", text)
+        return "".join(c for c in unicodedata.normalize("NFD", text) if not unicodedata.combining(c))
+
+    texts = [path.read_text() for path in sorted(FIXTURES_PATH.glob("**/*.txt"))]
+    texts += ["Café déjà vu — ÅNGSTRÖM!", "İstanbul\u00a0\u2003tabs\tand\x1cseparators", "  Hello,  World!\n", ""]
+    assert normalize_texts(texts) == [reference_normalize_text(text) for text in texts]
+
+
+def test_rolling_shingle_hashes_match_substring_shingles():
+    texts = [normalize_text(path.read_text()) for path in sorted(FIXTURES_PATH.glob("**/*.txt"))]
+    texts += ["café naïve 日本語 текст " * 20, "abc", ""]
+    for text in texts:
+        for use_char_ngrams in (True, False):
+            shingles = get_shingles(text, 5, use_char_ngrams)
+            hashes = rolling_shingle_hashes(text, 5, use_char_ngrams)
+            assert hashes.dtype == np.uint64 and len(hashes) == len(shingles)
+            # Equal shingles get equal hashes, and distinct shingles do not collide
+            first_positions = {shingle: i for i, shingle in reversed(list(enumerate(shingles)))}
+            expected = np.array([first_positions[shingle] for shingle in shingles], dtype=np.int64)
+            _, first_index, inverse = np.unique(hashes, return_index=True, return_inverse=True)
+            np.testing.assert_array_equal(first_index[inverse], expected)
+
+
+def test_scalable_bloom_filter_first_seen():
+    rng = np.random.default_rng(0)
+    hashes = rng.integers(0, 2**63, size=200_000, dtype=np.uint64)
+    bloom_filter = ScalableBloomFilter(initial_capacity=10_000, error_rate=1e-3)
+
+    seen = np.concatenate([bloom_filter.add(chunk) for chunk in np.array_split(hashes, 7)])
+    assert len(bloom_filter.filters) > 1
+    # Every hash is new, so anything reported as seen is a false positive
+    assert seen.mean() < 1e-3
+    assert bloom_filter.add(hashes[:1000]).all()
+    np.testing.assert_array_equal(bloom_filter.add(np.array([7, 7, 8, 7], dtype=np.uint64)), [False, True, False, True])
+
+    capped = ScalableBloomFilter(initial_capacity=1_000, error_rate=1e-3, max_bytes=4096)
+    capped.add(hashes)
+    assert capped.nbytes <= 4096
+
+
+def test_paragraph_deduplication_warc(tmp_path):
+    boilerplate = "Subscribe to our newsletter for the latest updates."
+    documents = [
+        ["An article about gardening and the best time to plant tomatoes.", boilerplate, "", "Water them daily."],
+        ["A different story about local elections and turnout numbers.", boilerplate],
+        [boilerplate, "Water them daily."],
+    ]
+    for shard_idx, shard_documents in enumerate([documents[:2], documents[2:]]):
+        with gzip.open(tmp_path / f"shard{shard_idx}.jsonl.gz", "wt") as f:
+            for paragraphs in shard_documents:
+                f.write(json.dumps({"text": "\n".join(paragraphs), "url": f"https://example.com/{shard_idx}"}) + "\n")
+            f.write("not json\n")
+
+    stats = paragraph_deduplication_warc(
+        [str(tmp_path / "shard0.jsonl.gz"), str(tmp_path / "shard1.jsonl.gz")],
+        str(tmp_path / "out"),
+        min_document_length=10,
+    )
+
+    with gzip.open(tmp_path / "out" / "shard0.jsonl.gz", "rt") as f:
+        shard0 = f.read().splitlines()
+    with gzip.open(tmp_path / "out" / "shard1.jsonl.gz", "rt") as f:
+        shard1 = f.read().splitlines()
+    assert [json.loads(line)["text"] for line in shard0[:2]] == ["\n".join(documents[0]), documents[1][0]]
+    assert json.loads(shard0[0])["url"] == "https://example.com/0"
+    # The third document only consists of paragraphs seen before
+    assert shard0[2:] == ["not json"] and shard1 == ["not json"]
+    assert stats == {"num_documents": 3, "num_documents_dropped": 1, "num_paragraphs": 7, "num_paragraphs_removed": 3}
+
+
+@pytest.mark.parametrize("clustering, verify_clusters", [("pairs", True), ("union_find", False)])
+def test_parallel_lsh_edges_match_sequential_duplicates(tmp_path, clustering, verify_clusters):
+    num_hashes, num_bands = 8, 4
+    rng = np.random.default_rng(0)
+    # A small alphabet makes most bands collide with several other rows
+    signatures = rng.integers(0, 3, size=(200, num_hashes), dtype=np.uint32)
+    # Rows 1 and 2 share a bucket with row 0 and are near-duplicates of each other, but not of row 0
+    signatures[0] = [5, 5, 6, 6, 6, 6, 6, 6]
+    signatures[1] = signatures[2] = [5, 5, 7, 7, 7, 7, 7, 7]
+
+    signature_path = str(tmp_path / "signatures.bin")
+    records = np.zeros(len(signatures), dtype=signature_record_dtype(num_hashes))
+    records["doc_id"] = np.arange(len(signatures))
+    records["signature"] = signatures
+    records.tofile(signature_path)
+
+    edges = parallel_lsh_edges(signature_path, num_hashes, num_bands, 0.7, clustering, verify_clusters, "local", 2)
+    sequential = find_duplicate_rows(signatures, num_bands, 0.7, clustering, verify_clusters)
+    parallel = duplicate_rows_from_edges(len(signatures), edges, clustering)
+    assert parallel.tolist() == sequential.tolist()
+    assert 2 in parallel
+
+
+def test_parallel_lsh_edges_verify_representatives_in_linear_edges(tmp_path):
+    num_hashes, num_bands = 8, 4
+    # One hot bucket of identical rows, plus rows 1 and 2 that share every band's bucket with row 0 but are
+    # near-duplicates only of each other
+    signatures = np.zeros((1000, num_hashes), dtype=np.uint32)
+    signatures[1] = signatures[2] = [0, 0, 0, 0, 0, 0, 7, 7]
+    signature_path = str(tmp_path / "signatures.bin")
+    records = np.zeros(len(signatures), dtype=signature_record_dtype(num_hashes))
+    records["doc_id"] = np.arange(len(signatures))
+    records["signature"] = signatures
+    records.tofile(signature_path)
+
+    edges = parallel_lsh_edges(signature_path, num_hashes, num_bands, 0.9, "union_find", True, "local", 2)
+    # Each band links every row to one representative instead of emitting the ~500k pairs of the bucket
+    assert len(edges) < num_bands * len(signatures)
+    roots = connected_component_roots(len(signatures), edges)
+    assert roots[1] == roots[2] == 1
+    assert (np.delete(roots, [1, 2]) == 0).all()
+    assert duplicate_rows_from_edges(len(signatures), edges, "union_find").tolist() == [2] + list(range(3, 1000))
+
+
+def test_connected_component_roots_match_union_find():
+    rng = np.random.default_rng(0)
+    edges = np.sort(rng.integers(0, 500, size=(400, 2)), axis=1)
+    clusters = UnionFind(500)
+    for x, y in edges.tolist():
+        clusters.union(x, y)
+    assert connected_component_roots(500, edges).tolist() == clusters.roots().tolist()
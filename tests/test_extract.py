@@ -1,5 +1,7 @@
 import logging
 
+from cs336_data.extraction import declared_charset, extract_text_from_html_bytes, extract_texts_from_html_bytes
+
 from .adapters import run_extract_text_from_html_bytes
 from .common import FIXTURES_PATH
 
@@ -14,3 +16,46 @@ def test_extract_text_from_html_bytes():
     with open(moby_expected_path) as f:
         moby_expected_text = f.read()
     assert moby_expected_text == run_extract_text_from_html_bytes(moby_bytes)
+
+
+def test_extract_text_uses_declared_charset():
+    html = "<html><body><p>Съешь же ещё этих мягких французских булок</p></body></html>"
+    expected = "Съешь же ещё этих мягких французских булок"
+    html_bytes = html.encode("koi8-r")
+    assert declared_charset(html_bytes, "text/html; charset=KOI8-R") == "koi8-r"
+    assert extract_text_from_html_bytes(html_bytes, "text/html; charset=KOI8-R") == expected
+
+    meta_html_bytes = html.replace("<html>", '<html><head><meta charset="koi8-r"></head>').encode("koi8-r")
+    assert declared_charset(meta_html_bytes) == "koi8-r"
+    assert extract_text_from_html_bytes(meta_html_bytes) == expected
+
+
+def test_extract_text_falls_back_when_charset_contradicts_data():
+    html_bytes = "<html><body><p>Ein schöner Tag für große Grüße</p></body></html>".encode("cp1252")
+    # Not valid UTF-8, so the declaration is ignored and the encoding detected instead
+    assert declared_charset(html_bytes, "text/html; charset=utf-8") == "utf-8"
+    assert extract_text_from_html_bytes(html_bytes, "text/html; charset=utf-8") == "Ein schöner Tag für große Grüße"
+    assert declared_charset(html_bytes, "text/html; charset=not-a-charset") is None
+
+
+def test_extract_text_decodes_latin1_declarations_as_windows_1252():
+    html_bytes = b'<html><head><meta charset="iso-8859-1"></head><body><p>\x93quoted\x94 caf\xe9</p></body></html>'
+    assert declared_charset(html_bytes) == "cp1252"
+    assert extract_text_from_html_bytes(html_bytes) == "\u201cquoted\u201d caf\u00e9"
+    assert declared_charset(b"", "text/html; charset=us-ascii") == "cp1252"
+
+
+def test_extract_text_detects_utf8_mislabeled_as_single_byte():
+    html_bytes = "<html><body><p>Un café – très bon</p></body></html>".encode("utf-8")
+    assert extract_text_from_html_bytes(html_bytes, "text/html; charset=iso-8859-1") == "Un café – très bon"
+
+
+def test_extract_texts_from_html_bytes_matches_single():
+    with open(FIXTURES_PATH / "moby.html", "rb") as f:
+        moby_bytes = f.read()
+    html_bytes_list = [moby_bytes, "<p>Grüße</p>".encode("utf-8"), "<p>already text</p>"]
+    content_types = [None, "text/html; charset=utf-8", None]
+    assert extract_texts_from_html_bytes(html_bytes_list, content_types, num_threads=4) == [
+        extract_text_from_html_bytes(html_bytes, content_type)
+        for html_bytes, content_type in zip(html_bytes_list, content_types)
+    ]
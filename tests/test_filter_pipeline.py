@@ -0,0 +1,91 @@
+import logging
+import time
+
+import numpy as np
+
+from cs336_data.filter_pipeline import FilterPipeline, FilterStage
+
+logger = logging.getLogger(__name__)
+
+
+def make_stage(name, keep_fn, calls):
+    def predict(documents):
+        calls.append((name, len(documents)))
+        return np.array([keep_fn(document) for document in documents], dtype=bool)
+
+    return FilterStage(name, predict)
+
+
+def test_filter_pipeline_short_circuits():
+    calls = []
+    pipeline = FilterPipeline(
+        [
+            make_stage("short", lambda document: len(document.text) > 3, calls),
+            make_stage("vowel", lambda document: document.text[0] in "aeiou", calls),
+        ],
+        reorder=False,
+    )
+    documents = pipeline.filter_batch(["abcdef", "ab", "bcdefg", "aeiou"])
+
+    assert [document.rejected_by for document in documents] == [None, "short", "vowel", None]
+    # The second stage only sees the documents the first stage kept
+    assert calls == [("short", 4), ("vowel", 3)]
+    assert pipeline.stats() == {
+        "short_filtered_count": 1,
+        "vowel_filtered_count": 1,
+        "number_kept": 2,
+        "number_total": 4,
+    }
+
+
+def test_filter_pipeline_shares_derived_views():
+    seen = []
+    pipeline = FilterPipeline(
+        [
+            make_stage("first", lambda document: seen.append(document.flat_text) or True, []),
+            make_stage("second", lambda document: seen.append(document.flat_text) or True, []),
+        ],
+        reorder=False,
+    )
+    pipeline.filter_batch(["a\nb"])
+    assert seen == ["a b", "a b"]
+    assert seen[0] is seen[1]
+
+
+def test_filter_pipeline_reorders_selective_stages_first():
+    pipeline = FilterPipeline(
+        [
+            make_stage("permissive", lambda document: True, []),
+            make_stage("selective", lambda document: document.text == "keep", []),
+        ],
+        reorder_interval=10,
+        min_samples=10,
+    )
+    texts = ["keep"] + ["drop"] * 9
+    first_documents = pipeline.filter_batch(texts)
+    assert [stage.name for stage in pipeline.stages] == ["selective", "permissive"]
+
+    # The kept set does not depend on the stage order
+    second_documents = pipeline.filter_batch(texts)
+    assert [document.rejected_by is None for document in first_documents] == [
+        document.rejected_by is None for document in second_documents
+    ]
+
+
+def test_filter_pipeline_reorders_stages_that_see_few_documents():
+    def slow_half(document):
+        time.sleep(0.001)
+        return document.text.endswith("0")
+
+    pipeline = FilterPipeline(
+        [
+            make_stage("slow", slow_half, []),
+            make_stage("selective", lambda document: document.text == "keep0", []),
+        ],
+        reorder_interval=10,
+        min_samples=10,
+    )
+    pipeline.filter_batch(["keep0"] + [f"drop{i % 2}" for i in range(9)])
+    # The selective stage only saw the documents that the slow one kept, but is moved first anyway
+    assert [stage.name for stage in pipeline.stages] == ["selective", "slow"]
+    assert pipeline.stages[0].num_seen < pipeline.min_samples
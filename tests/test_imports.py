@@ -0,0 +1,27 @@
+import json
+import subprocess
+import sys
+
+from .common import FIXTURES_PATH
+
+REPO_ROOT = FIXTURES_PATH.parent.parent
+
+# Importing the package must not download NLTK data, load fastText models or pull in the libraries only
+# some entry points need, so it stays cheap for every submitit task and pytest worker. Checking which
+# modules got imported, rather than timing the import, keeps the test stable on slow or loaded machines.
+HEAVY_MODULES = ["fasttext", "nltk", "fsspec", "submitit", "tqdm", "fastwarc", "draccus", "transformers", "torch"]
+
+IMPORT_SCRIPT = """
+import json, sys
+import tests.adapters
+import cs336_data.filter_pipeline
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+def test_import_has_no_side_effects():
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    modules = {module.split(".")[0] for module in json.loads(output.splitlines()[-1])}
+    assert not modules & set(HEAVY_MODULES)
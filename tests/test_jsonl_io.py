@@ -0,0 +1,47 @@
+import gzip
+import json
+import logging
+
+import pytest
+
+from cs336_data.jsonl_io import StreamingJsonlWriter
+
+logger = logging.getLogger(__name__)
+
+
+def test_streaming_jsonl_writer_commits_atomically(tmp_path):
+    output_path = tmp_path / "documents.jsonl.gz"
+    with StreamingJsonlWriter(str(output_path), flush_interval=2) as writer:
+        for i in range(5):
+            writer.write({"text": f"document {i}"})
+        # Nothing is visible at the final path until the writer is committed
+        assert not output_path.exists()
+
+    with gzip.open(output_path, "rt") as f_in:
+        assert [json.loads(line)["text"] for line in f_in] == [f"document {i}" for i in range(5)]
+    assert not (tmp_path / "documents.jsonl.gz.tmp").exists()
+
+
+def test_streaming_jsonl_writer_removes_temporary_file_on_error(tmp_path):
+    output_path = tmp_path / "documents.jsonl.gz"
+    with pytest.raises(RuntimeError):
+        with StreamingJsonlWriter(str(output_path)) as writer:
+            writer.write({"text": "document"})
+            raise RuntimeError("interrupted")
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_streaming_jsonl_writer_resumes_from_checkpoint(tmp_path):
+    output_path = tmp_path / "documents.jsonl.gz"
+    writer = StreamingJsonlWriter(str(output_path), remove_on_error=False)
+    writer.write({"text": "before checkpoint"})
+    checkpoint_bytes = writer.checkpoint()
+    writer.write({"text": "lost when the task is killed"})
+    writer.abort(remove=False)
+
+    with StreamingJsonlWriter(str(output_path), resume_from_bytes=checkpoint_bytes) as writer:
+        writer.write({"text": "after checkpoint"})
+
+    with gzip.open(output_path, "rt") as f_in:
+        assert [json.loads(line)["text"] for line in f_in] == ["before checkpoint", "after checkpoint"]
@@ -1,6 +1,6 @@
 import logging
 
-from .adapters import run_identify_language
+from .adapters import run_identify_language, run_identify_language_batch
 from .common import FIXTURES_PATH
 
 logger = logging.getLogger(__name__)
@@ -25,3 +25,16 @@ def test_identify_language_chinese_simplified():
     assert predicted_language == "zh"
     assert isinstance(score, float)
     assert score > 0
+
+
+def test_identify_language_batch_matches_single():
+    moby_expected_path = FIXTURES_PATH / "moby_extracted.txt"
+    with open(moby_expected_path) as f:
+        moby_expected_text = f.read()
+    texts = [moby_expected_text, "欢迎来到我们的网站"]
+    predicted_languages, scores = run_identify_language_batch(texts)
+    assert list(predicted_languages) == ["en", "zh"]
+    for text, predicted_language, score in zip(texts, predicted_languages, scores):
+        expected_language, expected_score = run_identify_language(text)
+        assert predicted_language == expected_language
+        assert abs(score - expected_score) < 1e-6
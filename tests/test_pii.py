@@ -1,6 +1,10 @@
+import gzip
+import json
 import logging
 
-from .adapters import run_mask_emails, run_mask_ips, run_mask_phone_numbers
+from cs336_data.mask_pii_shards import mask_pii_shards
+
+from .adapters import run_mask_all_pii, run_mask_emails, run_mask_ips, run_mask_phone_numbers
 
 logger = logging.getLogger(__name__)
 
@@ -57,3 +61,53 @@ def test_mask_ips():
     masked_text, num_masked = run_mask_ips(test_string)
     assert masked_text == expected_masked_text
     assert num_masked == 1
+
+
+def test_mask_all_pii_counts_each_type():
+    test_string = "Mail pl@fakedomain.ai or spl@fakedomain.ai, call 283-182-3829, or ssh to 192.0.2.146."
+    masked_text, counts = run_mask_all_pii(test_string)
+    assert masked_text == (
+        "Mail |||EMAIL_ADDRESS||| or |||EMAIL_ADDRESS|||, call |||PHONE_NUMBER|||, or ssh to |||IP_ADDRESS|||."
+    )
+    assert counts == {"email": 2, "phone_number": 1, "ip_address": 1}
+
+
+def test_mask_all_pii_only_masks_requested_types():
+    test_string = "Mail pl@fakedomain.ai or call 283-182-3829."
+    masked_text, counts = run_mask_all_pii(test_string, types=["phone_number", "ip_address"])
+    assert masked_text == "Mail pl@fakedomain.ai or call |||PHONE_NUMBER|||."
+    assert counts == {"phone_number": 1, "ip_address": 0}
+    assert run_mask_all_pii("No personal data here.") == (
+        "No personal data here.", {"email": 0, "phone_number": 0, "ip_address": 0}
+    )
+
+
+def test_mask_pii_shards_rewrites_shards_and_stats(tmp_path):
+    input_dir, output_dir = tmp_path / "documents", tmp_path / "masked"
+    input_dir.mkdir()
+    shards = {
+        "first": [{"text": "Mail pl@fakedomain.ai or spl@fakedomain.ai", "url": "a"}, {"text": "No PII"}],
+        "second": [{"text": "Call 283-182-3829 or ssh to 192.0.2.146."}],
+    }
+    for name, records in shards.items():
+        with gzip.open(input_dir / f"{name}.jsonl.gz", "wt") as f_out:
+            f_out.writelines(json.dumps(record) + "\n" for record in records)
+    (input_dir / "first.stats").write_text(json.dumps({"number_kept": 2}))
+
+    input_files = sorted(str(path) for path in input_dir.glob("*.jsonl.gz"))
+    stats = mask_pii_shards(input_files, str(output_dir), num_workers=2)
+
+    with gzip.open(output_dir / "first.jsonl.gz", "rt") as f_in:
+        assert [json.loads(line) for line in f_in] == [
+            {"text": "Mail |||EMAIL_ADDRESS||| or |||EMAIL_ADDRESS|||", "url": "a"}, {"text": "No PII"}
+        ]
+    assert json.loads((output_dir / "first.stats").read_text()) == {
+        "number_kept": 2,
+        "email_masked_count": 2,
+        "phone_number_masked_count": 0,
+        "ip_address_masked_count": 0,
+        "number_masked_documents": 1,
+    }
+    assert (output_dir / "second.SUCCESS").exists()
+    assert stats["phone_number_masked_count"] == 1 and stats["ip_address_masked_count"] == 1
+    assert stats["number_masked_documents"] == 2
@@ -0,0 +1,38 @@
+import gzip
+import io
+import logging
+
+from warcio.warcwriter import WARCWriter
+
+from cs336_data.process_wet_files import iter_wet_chunks
+
+logger = logging.getLogger(__name__)
+
+
+def write_wet_file(path, texts):
+    with open(path, "wb") as f_out:
+        writer = WARCWriter(f_out, gzip=True)
+        for i, text in enumerate(texts):
+            record = writer.create_warc_record(
+                f"http://example.com/{i}",
+                "conversion",
+                payload=io.BytesIO(text.encode("utf-8")),
+                warc_content_type="text/plain",
+            )
+            writer.write_record(record)
+
+
+def test_iter_wet_chunks_flags_last_chunk_of_each_file(tmp_path):
+    first_path = tmp_path / "first.warc.wet.gz"
+    empty_path = tmp_path / "empty.warc.wet.gz"
+    with gzip.open(empty_path, "wb"):
+        pass
+    write_wet_file(first_path, [f"document {i}" for i in range(5)])
+
+    chunks = list(iter_wet_chunks([str(first_path), str(empty_path)], chunk_size=2))
+    assert chunks == [
+        (0, 0, ["document 0", "document 1"], False),
+        (0, 1, ["document 2", "document 3"], False),
+        (0, 2, ["document 4"], True),
+        (1, 0, [], True),
+    ]
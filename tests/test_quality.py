@@ -1,6 +1,10 @@
 import logging
 
-from .adapters import run_classify_quality, run_gopher_quality_filter
+from .adapters import (
+    run_classify_quality,
+    run_gopher_quality_filter,
+    run_gopher_quality_filter_with_stats,
+)
 from .common import FIXTURES_PATH
 
 logger = logging.getLogger(__name__)
@@ -92,3 +96,34 @@ def test_gopher_less_than_80_percent_words_with_alphabetic_character():
     words += ["word" for _ in range(2)]
     text = "the and " + " ".join(words)
     assert not run_gopher_quality_filter(text)
+
+
+def test_gopher_fast_tokenizer_matches_nltk_within_tolerance():
+    for fixture in ["high_quality_wiki_reference.txt", "low_quality_cc.txt", "moby_extracted.txt"]:
+        with open(FIXTURES_PATH / fixture) as f:
+            text = f.read()
+        exact_keep, exact_stats = run_gopher_quality_filter_with_stats(text, tokenizer="nltk")
+        fast_keep, fast_stats = run_gopher_quality_filter_with_stats(text, tokenizer="fast")
+
+        assert abs(fast_stats.num_words - exact_stats.num_words) <= 0.02 * exact_stats.num_words
+        assert abs(fast_stats.mean_word_length - exact_stats.mean_word_length) <= 0.02 * exact_stats.mean_word_length
+        assert abs(fast_stats.alphabetic_fraction - exact_stats.alphabetic_fraction) <= 0.01
+        assert fast_stats.ellipsis_line_fraction == exact_stats.ellipsis_line_fraction
+        assert fast_keep == exact_keep
+
+
+def test_gopher_fast_tokenizer_rules():
+    text = "The string you are reading is an okay example of text. " * 5000
+    keep, stats = run_gopher_quality_filter_with_stats(text, tokenizer="fast")
+    assert keep
+    assert stats.num_words == 12 * 5000
+
+    text = "the be " * 100
+    keep, stats = run_gopher_quality_filter_with_stats(text, tokenizer="fast")
+    assert not keep
+    assert stats.mean_word_length == 2.5
+
+    words = ["123" for _ in range(8)] + ["word" for _ in range(2)]
+    keep, stats = run_gopher_quality_filter_with_stats("the and " + " ".join(words), tokenizer="fast")
+    assert not keep
+    assert stats.alphabetic_fraction == 4 / 12
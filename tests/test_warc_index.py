@@ -0,0 +1,67 @@
+import os
+
+from fastwarc.warc import WarcRecordType
+
+from cs336_data.warc_index import count_warc_records, hash_uri, iter_records_at, load_warc_index, warc_index_path
+from .test_convert_warc_to_text import write_warc_file
+
+RESPONSES = [
+    ("200 OK", "text/html; charset=utf-8", b"<p>first</p>"),
+    ("200 OK", "image/png", b"\x89PNG"),
+    ("404 Not Found", "text/html", b"<p>missing</p>"),
+]
+
+
+def test_warc_index_counts_and_seeks(tmp_path):
+    warc_path = str(tmp_path / "responses.warc.gz")
+    write_warc_file(warc_path, RESPONSES)
+
+    index = load_warc_index(warc_path)
+    assert os.path.exists(warc_index_path(warc_path))
+    assert len(index) == 3
+    assert index.count(WarcRecordType.response) == 3
+    assert index.count(WarcRecordType.conversion) == 0
+    assert index.count(WarcRecordType.response, ["text/html"]) == 2
+    assert index.records["offset"][0] == 0
+    assert int(index.records["length"].sum()) == os.path.getsize(warc_path)
+    assert index.records["uri_hash"][1] == hash_uri("http://example.com/1")
+
+    offsets = index.offsets(content_types=["image/png", "text/html"])[::-1]
+    bodies = [record.reader.read() for record in iter_records_at(warc_path, offsets)]
+    assert bodies == [b"<p>missing</p>", b"\x89PNG", b"<p>first</p>"]
+
+
+def test_warc_index_is_rebuilt_when_stale(tmp_path):
+    warc_path = str(tmp_path / "responses.warc.gz")
+    write_warc_file(warc_path, RESPONSES[:1])
+    assert len(load_warc_index(warc_path)) == 1
+
+    write_warc_file(warc_path, RESPONSES)
+    assert len(load_warc_index(warc_path)) == 3
+    assert len(load_warc_index(warc_path, build=False)) == 3
+
+
+def test_warc_index_in_index_directory(tmp_path):
+    warc_paths = []
+    for crawl in ["crawl-a", "crawl-b"]:
+        warc_path = tmp_path / crawl / "responses.warc.gz"
+        warc_path.parent.mkdir()
+        write_warc_file(warc_path, RESPONSES[:2] if crawl == "crawl-a" else RESPONSES)
+        warc_paths.append(str(warc_path))
+
+    index_directory = str(tmp_path / "indexes")
+    assert [len(load_warc_index(warc_path, index_directory=index_directory)) for warc_path in warc_paths] == [2, 3]
+    assert len(os.listdir(index_directory)) == 2
+    assert not any(os.path.exists(warc_index_path(warc_path)) for warc_path in warc_paths)
+    assert len(load_warc_index(warc_paths[1], index_directory=index_directory, build=False)) == 3
+
+
+def test_warc_index_is_used_unsaved_when_it_cannot_be_written(tmp_path):
+    warc_path = str(tmp_path / "responses.warc.gz")
+    write_warc_file(warc_path, RESPONSES)
+    # A file where the index directory should be makes every save fail
+    (tmp_path / "read-only").write_text("")
+
+    count = count_warc_records(warc_path, int(WarcRecordType.response), ["text/html"], str(tmp_path / "read-only"))
+    assert count == 2
+    assert sorted(os.listdir(tmp_path)) == ["read-only", "responses.warc.gz"]